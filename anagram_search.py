@@ -0,0 +1,94 @@
+import time
+from collections.abc import Iterator
+from functools import lru_cache
+from itertools import combinations_with_replacement, product
+
+import numpy as np
+
+from dictionary import AnagramLookupTable, dictionary_popular
+from word_search import count_letters
+
+
+@lru_cache(maxsize=1)
+def popular_ranks() -> dict[str, int]:
+    ranks = {}
+    for rank, word in enumerate(dictionary_popular.words()):
+        ranks.setdefault(word, rank)
+    return ranks
+
+def popularity_rank(word: str) -> int:
+    return popular_ranks().get(word, len(dictionary_popular))
+
+@lru_cache(maxsize=None)
+def key_ranks(lookup_table: AnagramLookupTable) -> np.ndarray:
+    # rank of the most common word of every key of the table, by key id, computed once and not with every search
+    return np.array([min([popularity_rank(w) for w in lookup_table.table[k]]) for k in lookup_table.letter_counts.entries], dtype=np.int32)
+
+
+class MultiwordAnagramSearch:
+    lookup_table: AnagramLookupTable
+    keys: list[str]  # sorted letters of candidate words, most common first
+    positions: dict[str, int]
+    counts: np.ndarray
+    lengths: np.ndarray
+
+    def __init__(self, lookup_table: AnagramLookupTable, letters: str, min_word_length: int) -> None:
+        self.lookup_table = lookup_table
+
+        ids, counts = lookup_table.letter_counts.find_ids(letters, partial=True)
+        lengths = counts.sum(axis=1, dtype=np.int16)
+        long_enough = lengths >= min_word_length
+        ids, counts, lengths = ids[long_enough], counts[long_enough], lengths[long_enough]
+
+        order = np.lexsort((-lengths, key_ranks(lookup_table)[ids]))
+        self.keys = [lookup_table.letter_counts.entries[i] for i in ids[order]]
+        self.positions = { k: i for i, k in enumerate(self.keys) }
+        self.counts = counts[order].astype(np.int16)
+        self.lengths = lengths[order]
+
+    def search(self, letters: str, max_words: int, min_word_length: int, timeout_stamp: float) -> Iterator[list[str]]:
+        remaining = count_letters([letters], len(letters))[0].astype(np.int16)
+        yield from self._search(remaining, len(letters), np.arange(len(self.keys)), [], max_words, min_word_length, timeout_stamp)
+
+    def _search(self, remaining: np.ndarray, num_remaining: int, candidates: np.ndarray, chosen: list[str], words_left: int, min_word_length: int, timeout_stamp: float) -> Iterator[list[str]]:
+        if time.time() > timeout_stamp or len(candidates) == 0:
+            return
+
+        # last word, the remaining letters have to be an anagram themselves
+        if words_left == 1:
+            key = "".join([chr(97 + i) * int(n) for i, n in enumerate(remaining[:26])])
+            if len(key) == num_remaining and self.positions.get(key, -1) >= candidates[0]:
+                yield chosen + [key]
+            return
+
+        # only keep words that still fit into the remaining letters
+        fitting = candidates[np.all(self.counts[candidates] <= remaining, axis=1)]
+        if len(fitting) == 0 or num_remaining > words_left * int(self.lengths[fitting].max()):
+            return
+
+        for position, i in enumerate(fitting):
+            key = self.keys[i]
+            left = num_remaining - len(key)
+            if left == 0:
+                yield chosen + [key]
+            elif left >= min_word_length:
+                # keys are only combined in list order, otherwise every permutation would be found again
+                yield from self._search(remaining - self.counts[i], left, fitting[position:], chosen + [key], words_left - 1, min_word_length, timeout_stamp)
+
+            if time.time() > timeout_stamp:
+                return
+
+    def phrases(self, keys: list[str]) -> list[str]:
+        groups = [(k, keys.count(k)) for k in sorted(set(keys), key=keys.index)]
+        options = [[list(c) for c in combinations_with_replacement(sorted(self.lookup_table.table[k], key=popularity_rank), n)] for k, n in groups]
+        return [" ".join([w for group in combination for w in group]) for combination in product(*options)]
+
+
+def find_multiword_anagrams(letters: str, lookup_table: AnagramLookupTable, timeout_stamp: float, max_words: int = 3, min_word_length: int = 3) -> Iterator[str]:
+    letters = "".join([c for c in letters.lower() if c.isalpha()])
+    if len(letters) == 0:
+        return
+
+    search = MultiwordAnagramSearch(lookup_table, letters, min_word_length)
+    for keys in search.search(letters, max_words, min_word_length, timeout_stamp):
+        yield from search.phrases(keys)
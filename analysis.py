@@ -1,24 +1,35 @@
 import re
-from ciphers import analysis_ciphers
-from dictionary import dictionary_all, AnagramLookupTable
+from ciphers import analysis_ciphers, substitution_word_weights
+from cryptanalysis import analyze_text, crack_vigenere, solve_substitution, vigenere_shift
+from dictionary import dictionary_all, dictionary_popular, get_anagram_lookup_table, get_language_model, get_word_set
+from lexicon import Lexicon
 from math import log2
 import time
-
-from collections.abc import Callable
+import heapq
+import hashlib
+import ctypes
+import multiprocessing
+import threading
+import queue
+import sys
+from collections import Counter, OrderedDict
+from contextvars import ContextVar
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import count
+
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from functools import lru_cache, wraps
+from typing import TypeVar
+
+import numpy as np
 
 
 # Frequency analysis
 
 def analyze_frequencies(string: str) -> dict[str, int]:
-    string = string.lower()
-    symbols = []
-    if " " in string:
-        symbols = string.split(" ")
-        if any([len(s) > 4 for s in symbols]):
-            symbols = [c for c in string if c.isalnum()]  # Only works for alphanumeric symbols
-    else:
-        symbols = [c for c in string]
-    return { s: string.count(s) for s in symbols }
+    # symbols are characters, or the space separated groups of Morse code, numbers and the like
+    return analyze_text(string).symbol_frequencies()
 
 def calculate_entropy(probs: list[float]) -> float:
     return sum([(-1.0) * p * log2(p) for p in probs])
@@ -26,6 +37,95 @@ def calculate_entropy(probs: list[float]) -> float:
 
 
 
+# Search statistics
+#
+# Opt in, pass a SearchStats to the search. The search loop records transforms, validation and the depth histogram
+# itself. Ciphers and validators report through current_search_stats, which is only set while a transform or a
+# validation runs, so it never leaks into other requests or between the steps of a streaming search.
+
+class OperationStats:
+    calls: int
+    seconds: float
+    produced: int  # candidates returned, matches for validators
+    pruned: int  # candidates dropped right away (seen already, not interesting)
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.seconds = 0.0
+        self.produced = 0
+        self.pruned = 0
+
+    def to_dict(self) -> dict:
+        return { "calls": self.calls, "seconds": self.seconds, "produced": self.produced, "pruned": self.pruned }
+
+
+class SearchStats:
+    transforms: dict[str, OperationStats]
+    ciphers: dict[str, OperationStats]  # only counts cache misses of apply_all_ciphers
+    validators: dict[str, OperationStats]  # only counts verdict cache misses
+    validations: int
+    verdicts_computed: int
+    expanded_by_depth: Counter[int]
+    candidates_by_depth: Counter[int]
+    results_by_depth: Counter[int]
+
+    def __init__(self) -> None:
+        self.transforms = {}
+        self.ciphers = {}
+        self.validators = {}
+        self.validations = 0
+        self.verdicts_computed = 0
+        self.expanded_by_depth = Counter()
+        self.candidates_by_depth = Counter()
+        self.results_by_depth = Counter()
+
+    @staticmethod
+    def operation(table: dict[str, OperationStats], name: str) -> OperationStats:
+        if name not in table:
+            table[name] = OperationStats()
+        return table[name]
+
+    def to_dict(self) -> dict:
+        return {
+            "transforms": { k: v.to_dict() for k, v in self.transforms.items() },
+            "ciphers": { k: v.to_dict() for k, v in self.ciphers.items() },
+            "validators": { k: v.to_dict() for k, v in self.validators.items() },
+            "validations": self.validations,
+            "verdicts_computed": self.verdicts_computed,
+            "expanded_by_depth": dict(self.expanded_by_depth),
+            "candidates_by_depth": dict(self.candidates_by_depth),
+            "results_by_depth": dict(self.results_by_depth),
+        }
+
+    def __str__(self) -> str:
+        lines = []
+        for title, table, produced in [("Transforms", self.transforms, "produced"), ("Ciphers (transform cache misses)", self.ciphers, "produced"), ("Validators (verdict cache misses)", self.validators, "matched")]:
+            lines.append(f"{title:<36} {'calls':>8} {'ms':>10} {produced:>10}" + (f" {'pruned':>10}" if table is self.transforms else ""))
+            for name, op in sorted(table.items(), key=lambda e: -e[1].seconds):
+                lines.append(f"  {name:<34} {op.calls:>8} {op.seconds * 1000:>10.1f} {op.produced:>10}" + (f" {op.pruned:>10}" if table is self.transforms else ""))
+            lines.append("")
+        lines.append(f"{self.validations} validations, {self.validations - self.verdicts_computed} answered by the verdict cache")
+        lines.append("")
+        lines.append(f"{'Depth':<36} {'expanded':>8} {'candidates':>10} {'results':>10}")
+        for depth in sorted(self.expanded_by_depth.keys() | self.candidates_by_depth.keys()):
+            lines.append(f"  {depth:<34} {self.expanded_by_depth[depth]:>8} {self.candidates_by_depth[depth]:>10} {self.results_by_depth[depth]:>10}")
+        return "\n".join(lines)
+
+
+current_search_stats: ContextVar[SearchStats | None] = ContextVar("current_search_stats", default=None)
+
+T = TypeVar("T")
+
+def run_with_stats(stats: SearchStats, fn: Callable[[], T]) -> T:
+    token = current_search_stats.set(stats)
+    try:
+        return fn()
+    finally:
+        current_search_stats.reset(token)
+
+
+
+
 # Transforms
 
 def string_reverse(string: str) -> tuple[str, str]:
@@ -55,9 +155,87 @@ def string_bigram_substitue(string: str) -> tuple[str, str] | None:
     return result, "bigram group"
 
 
+# Memoization of the expensive transforms, shared by all requests of the process
+
+TRANSFORM_CACHE_ENTRIES = 100_000
+TRANSFORM_CACHE_BYTES = 256 * 1024 * 1024
+
+class TransformCache:
+    entries: OrderedDict[tuple[str, str], tuple[tuple[str, str], ...]]
+    max_entries: int
+    max_bytes: int
+    size_bytes: int
+    hits: int
+    misses: int
+
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def entry_size(key: tuple[str, str], value: tuple[tuple[str, str], ...]) -> int:
+        # the step names are shared between entries and not counted
+        return sys.getsizeof(key[1]) + sys.getsizeof(value) + sum([sys.getsizeof(pair) + sys.getsizeof(v) for pair in value for v in pair[:1]])
+
+    def get(self, key: tuple[str, str]) -> tuple[tuple[str, str], ...] | None:
+        with self._lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple[str, str], value: tuple[tuple[str, str], ...]) -> None:
+        size = self.entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self.entries:
+                return
+            self.entries[key] = value
+            self.size_bytes += size
+            while len(self.entries) > self.max_entries or self.size_bytes > self.max_bytes:
+                old_key, old_value = self.entries.popitem(last=False)
+                self.size_bytes -= self.entry_size(old_key, old_value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+            self.size_bytes = 0
+
+    def __str__(self) -> str:
+        lookups = self.hits + self.misses
+        return f"{len(self.entries)} entries, {self.size_bytes / 1024 / 1024:.1f} MiB, {self.hits} hits / {lookups} lookups ({self.hits / max(lookups, 1):.0%})"
+
+transform_cache = TransformCache(TRANSFORM_CACHE_ENTRIES, TRANSFORM_CACHE_BYTES)
+
+def memoized_transform(transform: Callable[[str], list[tuple[str, str]]]) -> Callable[[str], list[tuple[str, str]]]:
+    @wraps(transform)
+    def cached(string: str) -> list[tuple[str, str]]:
+        key = (transform.__name__, string)
+        results = transform_cache.get(key)
+        if results is None:
+            results = tuple(transform(string))
+            transform_cache.put(key, results)
+        return list(results)
+    return cached
+
+
+@memoized_transform
 def apply_all_ciphers(string: str) -> list[tuple[str, str]]:
+    stats = current_search_stats.get()
     results = []
     for cipher in analysis_ciphers:
+        if stats is not None:
+            started, produced_before = time.perf_counter(), len(results)
+
         encoded = cipher.encode(string.encode("utf-8"))
         if isinstance(encoded, list):
            results += [(e, type(cipher).__name__) for e in encoded]
@@ -70,26 +248,98 @@ def apply_all_ciphers(string: str) -> list[tuple[str, str]]:
         elif decoded is not None:
             results.append((decoded.decode("utf-8"), type(cipher).__name__))
 
+        if stats is not None:
+            op = stats.operation(stats.ciphers, type(cipher).__name__)
+            op.calls += 1
+            op.seconds += time.perf_counter() - started
+            op.produced += len(results) - produced_before
+
     return results
 
-analysis_anagram_lookup_table = AnagramLookupTable(dictionary_all)
+analysis_anagram_lookup_table = get_anagram_lookup_table(dictionary_all)
+@memoized_transform
 def apply_anagram_search(string: str) -> list[tuple[str, str]]:
-    if "?" in string:
+    if string.count("?") * 3 > len(string):  # mostly unknown symbols, would match almost anything
         return []
     anagrams = analysis_anagram_lookup_table.lookup(string)
     return [(a, "anagram") for a in anagrams] if anagrams is not None else []
 
+# substitutions of the same text share their letter pattern, e.g. all Caesar shifts of a text, and are solved once
+SUBSTITUTION_MIN_LETTERS = 30
+SUBSTITUTION_MIN_IOC = 0.05  # monoalphabetic ciphers keep the IoC of English
+ANALYSIS_SUBSTITUTION_SECONDS = 0.3
+# text that scores like English (about -4) is solved already, ciphertexts and other junk score below -5
+SOLVED_SCORE = -5.0
+# the search does not count the time of the solver against its budget, up to this many seconds
+SOLVER_TIME_CREDIT_SECONDS = 3.0
+
+def letter_pattern(string: str) -> str:
+    table = {}
+    for c in string:
+        if "a" <= c <= "z" and ord(c) not in table:
+            table[ord(c)] = chr(97 + len(table))
+    return string.translate(table)
+
+@lru_cache(maxsize=1024)
+def solve_substitution_pattern(pattern: str) -> str | None:
+    results = solve_substitution(pattern, english_model, ANALYSIS_SUBSTITUTION_SECONDS, top_k=1, words=substitution_word_weights, seed=0)
+    return results[0][2] if len(results) != 0 else None
+
+@memoized_transform
+def apply_substitution_solver(string: str) -> list[tuple[str, str]]:
+    letters = sum([1 for c in string if "a" <= c <= "z"])
+    if letters < SUBSTITUTION_MIN_LETTERS:
+        return []
+    ioc = analyze_text(string).index_of_coincidence()
+    if ioc is None or ioc < SUBSTITUTION_MIN_IOC or english_model.score(string) >= SOLVED_SCORE:
+        return []
+    plaintext = solve_substitution_pattern(letter_pattern(string))
+    return [(plaintext, "substitution")] if plaintext is not None else []
+
+# periodic ciphers flatten the letter distribution, texts with the IoC of English are left to the other transforms
+# Caesar shifts of a Vigenère ciphertext are ciphertexts of the same plaintext with a shifted key, all shifts of a text
+# share the shift that starts with an a and are cracked once
+VIGENERE_RESULTS = 2
+
+def caesar_canonical(string: str) -> tuple[str, int]:
+    first = next((ord(c) - 97 for c in string if "a" <= c <= "z"), 0)
+    return vigenere_shift(string, chr(97 + first), -1), first
+
+@lru_cache(maxsize=1024)
+def crack_vigenere_canonical(canonical: str) -> tuple[tuple[str, str], ...]:
+    return tuple([(key, plaintext) for _, key, plaintext in crack_vigenere(canonical, english_model, top_k=VIGENERE_RESULTS)])
+
+@memoized_transform
+def apply_vigenere_cracker(string: str) -> list[tuple[str, str]]:
+    letters = sum([1 for c in string if "a" <= c <= "z"])
+    if letters < SUBSTITUTION_MIN_LETTERS:
+        return []
+    ioc = analyze_text(string).index_of_coincidence()
+    if ioc is None or ioc >= SUBSTITUTION_MIN_IOC or english_model.score(string) >= SOLVED_SCORE:
+        return []
+    canonical, shift = caesar_canonical(string)
+    results = []
+    for key, plaintext in crack_vigenere_canonical(canonical):
+        if len(key) > 1:  # a single letter is a Caesar shift
+            results.append((plaintext, f"vigenere {''.join([chr((ord(c) - 97 + shift) % 26 + 97) for c in key])}"))
+    return results
+
 def remove_spaces(string: str) -> tuple[str, str]:
     return string.replace(" ", ""), "remove spaces"
 
 
 
-transforms = [string_reverse, string_reverse_group_order, string_reverse_groups, remove_spaces, apply_all_ciphers, apply_anagram_search]
+transforms = [string_reverse, string_reverse_group_order, string_reverse_groups, remove_spaces, apply_all_ciphers, apply_anagram_search, apply_substitution_solver, apply_vigenere_cracker]
 
 
 # Validators
 
-def is_isbn(string: str, dictionary: list[str]) -> bool:
+NON_LETTERS = re.compile(r"[^a-z]")
+NON_DIGITS = re.compile(r"\D")
+WORD_SEPARATORS = re.compile(r"[\-:\.,;_]")
+SPECIAL_CHARS = frozenset("-:.,;_")
+
+def is_isbn(string: str, dictionary: Sequence[str]) -> bool:
     d = [int(c) if c.isdigit() else 10 for c in string.lower() if c.isdigit() or c == "x"]
     if len(d) == 10:
         d = [9, 8, 7] + d  # prepend 987 to convert to 13-digit ISBN
@@ -99,27 +349,49 @@ def is_isbn(string: str, dictionary: list[str]) -> bool:
     return checksum == 0
 
 
-def is_part_word(string: str, dictionary: list[str]) -> bool:
+def is_part_word(string: str, dictionary: Sequence[str] | frozenset[str]) -> bool:
+    if isinstance(dictionary, Lexicon):
+        dictionary = get_word_set(dictionary)
+
     words = []
-    special_chars = ["-", ":", ".", ",", ";", "_", ]
     if " " in string:
-        words += [re.sub(r"[^a-z]", "", w.lower()) for w in string.split(" ")]
-    if any([it in string for it in special_chars]):
-        words += [re.sub(r"[^a-z]", "", w.lower()) for w in re.sub(r"[\-:\.,;_]", " ", string).split(" ")]
+        words += [NON_LETTERS.sub("", w.lower()) for w in string.split(" ")]
+    if not SPECIAL_CHARS.isdisjoint(string):
+        words += [NON_LETTERS.sub("", w.lower()) for w in WORD_SEPARATORS.sub(" ", string).split(" ")]
     
     if len(words) == 0:
         words.append(string)
     
-    return any([word in dictionary for word in words if len(word) >= 3])
+    return any(word in dictionary for word in words if len(word) >= 3)
 
-def is_munich_phone_number(string: str, dictionary: list[str]) -> bool:
-    return re.sub(r"\D", "", string).startswith("4989")
+def is_munich_phone_number(string: str, dictionary: Sequence[str]) -> bool:
+    return NON_DIGITS.sub("", string).startswith("4989")
 
-def could_be_coordinate(string: str, dictionary: list[str]) -> bool:
+def could_be_coordinate(string: str, dictionary: Sequence[str]) -> bool:
     return (any([it in string for it in ["N", "S"]]) and any([it in string for it in ["E", "W"]])) and any([it.isdigit() for it in string])
 
 validators = [is_part_word, is_isbn, is_munich_phone_number, could_be_coordinate]
 
+VERDICT_CACHE_SIZE = 200_000
+
+@lru_cache(maxsize=VERDICT_CACHE_SIZE)
+def validate(string: str) -> Callable[[str, Sequence[str]], bool] | None:
+    stats = current_search_stats.get()
+    if stats is not None:
+        stats.verdicts_computed += 1
+    for v in validators:
+        if stats is not None:
+            started = time.perf_counter()
+        matched = v(string, dictionary_all)
+        if stats is not None:
+            op = stats.operation(stats.validators, v.__name__)
+            op.calls += 1
+            op.seconds += time.perf_counter() - started
+            op.produced += matched
+        if matched:
+            return v
+    return None
+
 
 
 
@@ -128,7 +400,7 @@ class BruteforceResult:
     string: str
     path: list[str]
     depth: int
-    validator: Callable[[str, list[str]], bool] | None
+    validator: Callable[[str, Sequence[str]], bool] | None
 
     def __init__(self, string: str, path: list[str], depth: int):
         self.string = string
@@ -140,59 +412,341 @@ class BruteforceResult:
         return f"{self.string}      ---   {"->".join(self.path)}   ---   {self.validator.__name__ if self.validator is not None else "none"}"
 
 
-def bruteforce_string(string: str, timeout_stamp: float, path: list[str] = [], total_iterations: int = 3, depth: int = 0, seen_already: set[str] = set()) -> set[BruteforceResult]:
-    if depth == total_iterations or time.time() > timeout_stamp:
-        return set()
-    
-    string = string.lower()
-    
-    results = set()
+english_model = get_language_model(dictionary_popular)
+
+# mean quadgram log probability of English text and of junk, plausibility maps them to about 1 and 0
+ENGLISH_SCORE = -4.5
+JUNK_SCORE = -7.0
+# intermediate strings are mostly not English yet (e.g. anagrams), the n-gram score only counts half in the frontier
+ENGLISH_WEIGHT = 0.5
+
+def letter_plausibility(string: str) -> float:
+    # does not depend on the order of the letters, so anagrams of words are not pushed back
+    if len(string) == 0:
+        return -1.0
+    letters = [c for c in string.lower() if c.isalpha()]
+    if len(letters) == 0:
+        return -0.5 - string.count("?") / len(string)
+    vowel_ratio = sum([c in "aeiouy" for c in letters]) / len(letters)
+    return len(letters) / len(string) - abs(vowel_ratio - 0.4) - string.count("?") / len(string)
+
+def plausibilities(strings: Sequence[str]) -> np.ndarray:
+    # guess how close candidates are to readable text, higher is better
+    english = (english_model.score_batch(strings) - JUNK_SCORE) / (ENGLISH_SCORE - JUNK_SCORE)
+    return ENGLISH_WEIGHT * english + (1 - ENGLISH_WEIGHT) * np.array([letter_plausibility(s) for s in strings], dtype=np.float64)
+
+def plausibility(string: str) -> float:
+    return float(plausibilities([string])[0])
+
+def expand_candidates(string: str, transform) -> list[tuple[str, str]]:
+    new_candidates = transform(string)
+    if isinstance(new_candidates, list):
+        return list(set(new_candidates))
+    return [new_candidates] if new_candidates is not None else []
+
+def is_interesting_candidate(string: str) -> bool:
+    # filter long, unknown, non alphanumerical
+    return len(string) < 200 and string.count("?") < 5 and any([c.isalnum() for c in string]) and not "No spaces in string" in string
+
+
+class SearchProgress:
+    nodes_expanded: int
+    candidates: int
+    start_time: float
 
+    def __init__(self) -> None:
+        self.nodes_expanded = 0
+        self.candidates = 0
+        self.start_time = time.time()
+
+    def nodes_per_second(self) -> float:
+        return self.nodes_expanded / max(time.time() - self.start_time, 1e-6)
+
+    def __str__(self) -> str:
+        return f"{self.nodes_expanded} nodes expanded, {self.candidates} candidates, {self.nodes_per_second():.0f} nodes/s"
+
+
+def bruteforce_search_iter(start_nodes: list[BruteforceResult], is_expired: Callable[[float], bool], total_iterations: int, seen_already: set[str], seen_elsewhere: Callable[[str], bool] | None = None, progress: SearchProgress | None = None, stats: SearchStats | None = None, extra_transforms: Sequence[Callable[[str], list[tuple[str, str]]]] = ()) -> Iterator[list[BruteforceResult]]:
+    # best first search over transform chains, the most plausible strings are expanded first
+    # yields the validated results of every expanded node (often none) so callers can stream and stop at any time
+    # extra_transforms, e.g. cipher pipelines, are tried at every node after the built in ones
+    # is_expired gets the seconds spent in the substitution solver, which do not count against the budget
+    tie_breaker = count()
+    solver_seconds = 0.0
+    frontier = [(n.depth * 0.5 - float(p), next(tie_breaker), n) for n, p in zip(start_nodes, plausibilities([n.string for n in start_nodes]))]
+    heapq.heapify(frontier)
+
+    while len(frontier) != 0 and not is_expired(solver_seconds):
+        _, _, node = heapq.heappop(frontier)
+        node_string = node.string.lower()
+        results = []
+
+        children = []
+        if stats is not None:
+            stats.expanded_by_depth[node.depth] += 1
+        for transform in transforms + list(extra_transforms):
+            started = time.perf_counter()
+            if stats is None:
+                expanded = expand_candidates(node_string, transform)
+            else:
+                expanded = run_with_stats(stats, lambda: expand_candidates(node_string, transform))
+                op = stats.operation(stats.transforms, transform.__name__)
+                op.calls += 1
+                op.seconds += time.perf_counter() - started
+                op.produced += len(expanded)
+            if transform is apply_substitution_solver:
+                solver_seconds = min(solver_seconds + time.perf_counter() - started, SOLVER_TIME_CREDIT_SECONDS)
+
+            for candidate, step in expanded:
+                if candidate in seen_already or not is_interesting_candidate(candidate):
+                    if stats is not None:
+                        op.pruned += 1
+                    continue
+                seen_already.add(candidate)
+                if seen_elsewhere is not None and seen_elsewhere(candidate):
+                    if stats is not None:
+                        op.pruned += 1
+                    continue
+
+                r = BruteforceResult(candidate, node.path + [step], node.depth + 1)
+                if stats is None:
+                    r.validator = validate(candidate)
+                else:
+                    r.validator = run_with_stats(stats, lambda: validate(candidate))
+                    stats.validations += 1
+                    stats.candidates_by_depth[r.depth] += 1
+                    if r.validator is not None:
+                        stats.results_by_depth[r.depth] += 1
+                if r.validator is not None:
+                    results.append(r)
+
+                if r.depth < total_iterations:
+                    children.append(r)
+
+        # all children of a node are scored in one batch
+        for r, p in zip(children, plausibilities([r.string for r in children])):
+            heapq.heappush(frontier, (r.depth * 0.5 - float(p), next(tie_breaker), r))
+
+        if progress is not None:
+            progress.nodes_expanded += 1
+            progress.candidates = len(seen_already)
+        yield results
+
+def bruteforce_search(start_nodes: list[BruteforceResult], is_expired: Callable[[float], bool], total_iterations: int, seen_already: set[str], seen_elsewhere: Callable[[str], bool] | None = None, stats: SearchStats | None = None) -> set[BruteforceResult]:
+    return set([r for results in bruteforce_search_iter(start_nodes, is_expired, total_iterations, seen_already, seen_elsewhere, stats=stats) for r in results])
+
+def bruteforce_string(string: str, timeout_stamp: float, total_iterations: int = 3, stats: SearchStats | None = None) -> set[BruteforceResult]:
+    return bruteforce_search([BruteforceResult(string, [], 0)], lambda credit: time.time() - credit > timeout_stamp, total_iterations, {string}, stats=stats)
+
+
+# Parallel bruteforce
+#
+# The first level of the search is expanded in the calling process and spread over a pool of forked workers,
+# which keep running between requests. Workers share two tables through shared memory: the deadline of every
+# running search (can be moved forward to stop all workers of a search) and a lossy table of string fingerprints
+# for cross-worker dedup. A fingerprint is salted with the search generation, so the table never has to be cleared.
+# Results are streamed back through one queue and routed to the waiting search by its generation.
+
+MAX_PARALLEL_SEARCHES = 64
+SHARED_SEEN_SLOTS = 1 << 20
+PROGRESS_REPORT_NODES = 64
+
+_shared_deadlines = None
+_shared_seen = None
+_shared_results = None
+_bruteforce_pool: ProcessPoolExecutor | None = None
+_bruteforce_workers = 0
+_search_slots = list(range(MAX_PARALLEL_SEARCHES))
+_search_slots_lock = threading.Lock()
+_search_generation = count(1)
+_result_queues: dict[int, queue.Queue] = {}
+
+def fingerprint(string: str, generation: int) -> int:
+    return int.from_bytes(hashlib.blake2b(f"{generation}:{string}".encode("utf-8"), digest_size=8).digest(), "little") | 1
+
+def _init_bruteforce_worker(deadlines, seen, results) -> None:
+    global _shared_deadlines, _shared_seen, _shared_results
+    _shared_deadlines, _shared_seen, _shared_results = deadlines, seen, results
+
+def _bruteforce_worker(start_nodes: list[BruteforceResult], total_iterations: int, slot: int, generation: int) -> None:
+    deadlines, seen, results_queue = _shared_deadlines, _shared_seen, _shared_results
+    assert deadlines is not None and seen is not None and results_queue is not None
+
+    def seen_elsewhere(string: str) -> bool:
+        fp = fingerprint(string, generation)
+        if seen[fp % SHARED_SEEN_SLOTS] == fp:
+            return True
+        seen[fp % SHARED_SEEN_SLOTS] = fp  # racy on purpose, a lost write only means duplicate work
+        return False
+
+    progress = SearchProgress()
+    reported = (0, 0)
+    search = bruteforce_search_iter(start_nodes, lambda credit: time.time() - credit > deadlines[slot], total_iterations, set([n.string for n in start_nodes]), seen_elsewhere, progress)
+    for results in search:
+        if len(results) != 0 or progress.nodes_expanded - reported[0] >= PROGRESS_REPORT_NODES:
+            results_queue.put((generation, results, (progress.nodes_expanded - reported[0], progress.candidates - reported[1]), False))
+            reported = (progress.nodes_expanded, progress.candidates)
+    results_queue.put((generation, [], (progress.nodes_expanded - reported[0], progress.candidates - reported[1]), True))
+
+def _dispatch_bruteforce_results() -> None:
+    assert _shared_results is not None
+    while True:
+        generation, results, nodes, finished = _shared_results.get()
+        target = _result_queues.get(generation)
+        if target is not None:  # the search may have been cancelled already
+            target.put((results, nodes, finished))
+
+def start_bruteforce_pool(workers: int) -> None:
+    global _bruteforce_pool, _bruteforce_workers, _shared_deadlines, _shared_seen, _shared_results
+    if _bruteforce_pool is not None:
+        return
+
+    context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else multiprocessing.get_context()
+    _shared_deadlines = context.RawArray(ctypes.c_double, MAX_PARALLEL_SEARCHES)
+    _shared_seen = context.RawArray(ctypes.c_uint64, SHARED_SEEN_SLOTS)
+    _shared_results = context.Queue()
+    _bruteforce_workers = workers
+    _bruteforce_pool = ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_bruteforce_worker, initargs=(_shared_deadlines, _shared_seen, _shared_results))
+
+    # start all workers now, not with the first request, and before the dispatcher thread, forking a process that
+    # runs threads can copy locks that are held
+    print(f"Starting {workers} bruteforce workers...")
+    for f in [_bruteforce_pool.submit(time.sleep, 0.1) for _ in range(workers)]:
+        f.result()
+    threading.Thread(target=_dispatch_bruteforce_results, daemon=True).start()
+
+def _discard_broken_pool(pool: ProcessPoolExecutor) -> None:
+    # A worker died, e.g. killed by the OOM killer, and the pool stays broken. It is not replaced: by now this
+    # process runs the threads of the app, which a fork would copy mid-operation, so searches run in the request
+    # thread from now on.
+    global _bruteforce_pool
+    with _search_slots_lock:
+        if _bruteforce_pool is not pool:
+            return
+        _bruteforce_pool = None
+    print("A bruteforce worker died, searching in a single process from now on")
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def bruteforce_string_parallel_iter(string: str, timeout_stamp: float, total_iterations: int = 3, progress: SearchProgress | None = None) -> Iterator[list[BruteforceResult]]:
+    if _bruteforce_pool is None or _shared_deadlines is None or _shared_seen is None:
+        yield from bruteforce_string_iter(string, timeout_stamp, total_iterations, progress=progress)
+        return
+
+    # expand the first level here, every worker continues from a share of the children
+    children = []
+    seen_already = {string}
     for transform in transforms:
-        # generate candidates
-        new_candidates = transform(string)
-        if isinstance(new_candidates, list):
-            new_results = [BruteforceResult(c[0], path + [c[1]], depth + 1) for c in set(new_candidates)]
-        else:
-            new_results = [BruteforceResult(new_candidates[0], path + [new_candidates[1]], depth + 1)]
-
-        # filter already seen, long, unknown, non alphanumerical
-        new_results = [r for r in new_results if not r.string in seen_already]
-        new_results = [r for r in new_results if len(r.string) < 200 and r.string.count("?") < 5]
-        new_results = [r for r in new_results if any([c.isalnum() for c in r.string]) and not "No spaces in string" in r.string]
-        
-        # for r in new_results:
-        #     print(r.string)
-
-        
-        # todo move deepen and validation out of transform iteration?
-
-        # deepen
-        seen_already = seen_already.union(set([r.string for r in new_results]))  # previous deeper iterations are now unseen, could be returned and passed around
-        new_results += [ cr for r in new_results for cr in bruteforce_string(r.string, timeout_stamp, r.path, total_iterations, depth + 1, seen_already) ]  # list comprehensions are magic
-
-        # add results
-        results = results.union(set(new_results))
-    
-    # validate
-    for r in results:
-        for v in validators:
-            if v(r.string, dictionary_all):
-                r.validator = v
-                break
-    
-    results = set([r for r in results if r.validator is not None])
+        for candidate, step in expand_candidates(string.lower(), transform):
+            if candidate not in seen_already and is_interesting_candidate(candidate):
+                seen_already.add(candidate)
+                children.append(BruteforceResult(candidate, [step], 1))
+
+    first_level = []
+    for r in children:
+        r.validator = validate(r.string)
+        if r.validator is not None:
+            first_level.append(r)
+    if progress is not None:
+        progress.nodes_expanded += 1
+        progress.candidates += len(seen_already)
+    yield first_level
+    if total_iterations <= 1 or len(children) == 0:
+        return
+
+    def search_here() -> Iterator[list[BruteforceResult]]:
+        return bruteforce_search_iter(children, lambda credit: time.time() - credit > timeout_stamp, total_iterations, seen_already, progress=progress)
+
+    pool = _bruteforce_pool
+    with _search_slots_lock:
+        slot = _search_slots.pop() if len(_search_slots) != 0 else None
+    if slot is None:
+        # every shared memory slot belongs to a running search, this one runs here
+        yield from search_here()
+        return
+
+    generation = next(_search_generation)
+    _shared_deadlines[slot] = timeout_stamp
+    for s in seen_already:
+        fp = fingerprint(s, generation)
+        _shared_seen[fp % SHARED_SEEN_SLOTS] = fp
+    results_queue = queue.Queue()
+    _result_queues[generation] = results_queue
+
+    # the slot can only be reused once no worker reads its deadline anymore
+    futures = []
+    remaining = [0]
+    def release_slot(_):
+        with _search_slots_lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                _search_slots.append(slot)
+
+    shares = [children[i::_bruteforce_workers] for i in range(_bruteforce_workers) if len(children[i::_bruteforce_workers]) != 0]
+    broken = False
+    try:
+        for share in shares:
+            futures.append(pool.submit(_bruteforce_worker, share, total_iterations, slot, generation))
+    except BrokenProcessPool:
+        broken = True
+    remaining[0] = len(futures) + 1
+    for f in futures:
+        f.add_done_callback(release_slot)
+
+    try:
+        finished_workers = 0
+        while not broken and finished_workers < len(futures):
+            try:
+                results, nodes, finished = results_queue.get(timeout=0.1)
+            except queue.Empty:
+                for f in futures:
+                    if f.done() and isinstance(f.exception(), BrokenProcessPool):
+                        broken = True
+                    elif f.done() and f.exception() is not None:
+                        raise f.exception()
+                yield []
+                continue
+            finished_workers += finished
+            if progress is not None:
+                progress.nodes_expanded += nodes[0]
+                progress.candidates += nodes[1]
+            yield results
+    finally:
+        # stops all workers of this search, also when the caller stops iterating early
+        _shared_deadlines[slot] = 0.0
+        del _result_queues[generation]
+        release_slot(None)
+
+    if broken:
+        # the search starts over from the first level here, results found twice are merged by the callers
+        _discard_broken_pool(pool)
+        yield from search_here()
+
+def bruteforce_string_iter(string: str, timeout_stamp: float, total_iterations: int = 3, parallel: bool = False, progress: SearchProgress | None = None, stats: SearchStats | None = None, extra_transforms: Sequence[Callable[[str], list[tuple[str, str]]]] = ()) -> Iterator[list[BruteforceResult]]:
+    # statistics are only collected in this process and the workers only know the built in transforms, a search
+    # with stats or extra transforms always runs here
+    if parallel and stats is None and len(extra_transforms) == 0:
+        yield from bruteforce_string_parallel_iter(string, timeout_stamp, total_iterations, progress)
+    else:
+        yield from bruteforce_search_iter([BruteforceResult(string, [], 0)], lambda credit: time.time() - credit > timeout_stamp, total_iterations, {string}, progress=progress, stats=stats, extra_transforms=extra_transforms)
 
-    return results
-    
-def bruteforce_string_filter_sort(string: str, timeout_stamp: float, total_iterations: int = 4):
-    results = bruteforce_string(string, timeout_stamp=timeout_stamp, total_iterations=total_iterations)
-    results_filtered = []
+def bruteforce_string_parallel(string: str, timeout_stamp: float, total_iterations: int = 3) -> set[BruteforceResult]:
+    return set([r for results in bruteforce_string_parallel_iter(string, timeout_stamp, total_iterations) for r in results])
+
+def sort_bruteforce_results(results: Iterable[BruteforceResult]) -> list[BruteforceResult]:
+    results_by_string = {}
     for r in sorted(results, key=lambda r: r.depth):
-        if not r.string in [it.string for it in results_filtered]:
-            results_filtered.append(r)
-    results_filtered = list(sorted(results_filtered, key=lambda r: validators.index(r.validator)))
-    return results_filtered
+        results_by_string.setdefault(r.string, r)
+    # by validator, most English looking first within the same validator
+    unique = list(results_by_string.values())
+    scores = english_model.score_batch([r.string for r in unique])
+    return [r for r, _ in sorted(zip(unique, scores), key=lambda e: (validators.index(e[0].validator), -e[1]))]
+    
+def bruteforce_string_filter_sort(string: str, timeout_stamp: float, total_iterations: int = 4, parallel: bool = False):
+    if parallel:
+        results = bruteforce_string_parallel(string, timeout_stamp=timeout_stamp, total_iterations=total_iterations)
+    else:
+        results = bruteforce_string(string, timeout_stamp=timeout_stamp, total_iterations=total_iterations)
+    return sort_bruteforce_results(results)
 
 # Test
 if __name__ == "__main__":
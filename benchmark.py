@@ -0,0 +1,352 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+
+from analysis import SearchProgress, bruteforce_string_iter, crack_vigenere_canonical, solve_substitution_pattern, start_bruteforce_pool, string_reverse, string_reverse_group_order, string_reverse_groups, transform_cache, validate
+from ciphers import CaesarCipher, MorseCodeCipher, NumbersCipher, SMSMultiTapCipher, TapCodeCipher
+from cryptanalysis import substitution_table, vigenere_shift
+
+# Bruteforce benchmark: every puzzle of the corpus is an answer run through a chain of encodings, the search has to
+# find the answer again within a fixed budget.
+#
+#   python benchmark.py --output before.json
+#   python benchmark.py --output after.json --compare before.json
+#   python benchmark.py --scaling 4
+#
+# Time to answer stops at the first correct result. Throughput (nodes/s) and peak memory are measured in a separate
+# run over a fixed budget, which does not stop at the answer.
+
+BENCHMARK_FORMAT_VERSION = 2
+
+
+# Corpus
+
+def caesar(shift: int) -> Callable[[str], str]:
+    return lambda s: str(CaesarCipher().encode(s.encode("utf-8"), str(shift)))
+
+def numbers(s: str) -> str:
+    return NumbersCipher().encode(s.encode("utf-8"))
+
+def morse(s: str) -> str:
+    return MorseCodeCipher().encode(s.encode("utf-8"))
+
+def tap(s: str) -> str:
+    return TapCodeCipher().encode(s.encode("utf-8"))
+
+def sms(s: str) -> str:
+    return SMSMultiTapCipher().encode(s.encode("utf-8"))
+
+def unspaced(s: str) -> str:
+    return s.replace(" ", "")
+
+def reverse(s: str) -> str:
+    return string_reverse(s)[0]
+
+def reverse_groups(s: str) -> str:
+    return string_reverse_groups(s)[0]
+
+def reverse_group_order(s: str) -> str:
+    return string_reverse_group_order(s)[0]
+
+def scramble(s: str) -> str:
+    return "".join(sorted(s))
+
+def substitution(key: str) -> Callable[[str], str]:
+    return lambda s: s.translate(substitution_table(key, decrypt=False))
+
+def vigenere(key: str) -> Callable[[str], str]:
+    return lambda s: vigenere_shift(s, key, 1)
+
+
+class BenchmarkCase:
+    name: str
+    answer: str
+    puzzle: str
+
+    def __init__(self, name: str, answer: str, steps: list[Callable[[str], str]]) -> None:
+        self.name = name
+        self.answer = answer
+        self.puzzle = answer
+        for step in steps:
+            self.puzzle = step(self.puzzle)
+
+
+# morse and tap code have no symbol for a space, their answers are single words. Tap code reads every k as c.
+corpus = [
+    BenchmarkCase("caesar", "hello world", [caesar(13)]),
+    BenchmarkCase("caesar single word", "lighthouse", [caesar(7)]),
+    BenchmarkCase("numbers", "lighthouse", [numbers]),
+    BenchmarkCase("morse", "treasure", [morse]),
+    BenchmarkCase("tap", "garden", [tap]),
+    BenchmarkCase("sms", "meet at noon", [sms]),
+    BenchmarkCase("reverse", "find the key", [reverse]),
+    BenchmarkCase("reverse groups", "hidden door", [reverse_groups]),
+    BenchmarkCase("anagram", "playground", [scramble]),
+    BenchmarkCase("caesar morse", "treasure", [caesar(5), morse]),
+    BenchmarkCase("caesar numbers", "playground", [caesar(11), numbers]),
+    BenchmarkCase("morse group order", "keyhole", [morse, reverse_group_order]),
+    BenchmarkCase("sms reverse", "open sesame", [sms, reverse]),
+    BenchmarkCase("numbers reverse", "lantern", [numbers, reverse]),
+    BenchmarkCase("anagram morse", "playground", [scramble, morse]),
+    BenchmarkCase("anagram caesar", "treasure", [scramble, caesar(4)]),
+    BenchmarkCase("reverse caesar morse", "lighthouse", [reverse, caesar(3), morse]),
+    BenchmarkCase("caesar tap reverse", "garden", [caesar(5), tap, reverse]),
+    BenchmarkCase("caesar sms reverse groups", "meet at noon", [caesar(20), sms, reverse_groups]),
+    BenchmarkCase("anagram numbers reverse", "lantern", [scramble, numbers, reverse]),
+    BenchmarkCase("anagram caesar morse", "playground", [scramble, caesar(7), morse]),
+    BenchmarkCase("anagram caesar morse order", "treasure", [scramble, caesar(9), morse, reverse_group_order]),
+    BenchmarkCase("substitution", "the treasure is buried under the old tree near the river", [substitution("qwertyuiopasdfghjklzxcvbnm")]),
+    BenchmarkCase("substitution reverse", "meet me at the train station tomorrow morning", [substitution("mnbvcxzlkjhgfdsapoiuytrewq"), reverse]),
+    BenchmarkCase("unspaced morse", "lighthouse", [morse, unspaced]),
+    BenchmarkCase("unspaced sms", "meet at noon", [sms, unspaced]),
+    BenchmarkCase("unspaced tap reverse", "garden", [caesar(5), tap, unspaced, reverse]),
+    BenchmarkCase("vigenere", "we have found the key hidden in the library under the old red book", [vigenere("lemon")]),
+    BenchmarkCase("vigenere reverse", "bring a flashlight and meet the others at the old lighthouse", [vigenere("puzzle"), reverse]),
+]
+
+
+# Measurement
+
+def clear_caches() -> None:
+    transform_cache.clear()
+    validate.cache_clear()
+    solve_substitution_pattern.cache_clear()
+    crack_vigenere_canonical.cache_clear()
+
+def time_case(case: BenchmarkCase, timeout: float, depth: int, parallel: bool, cold: bool) -> dict:
+    if cold:
+        clear_caches()
+
+    progress = SearchProgress()
+    start = time.time()
+    time_to_answer = None
+    nodes_to_answer = None
+    answer_path = None
+
+    # stops at the first correct result, closing the search also stops the workers of a parallel search
+    search = bruteforce_string_iter(case.puzzle, timeout_stamp=start + timeout, total_iterations=depth, parallel=parallel, progress=progress)
+    for results in search:
+        correct = [r for r in results if r.string.lower() == case.answer]
+        if len(correct) != 0:
+            time_to_answer = time.time() - start
+            nodes_to_answer = progress.nodes_expanded
+            answer_path = correct[0].path
+            break
+    search.close()
+    return { "time_to_answer": time_to_answer, "nodes_to_answer": nodes_to_answer, "answer_path": answer_path }
+
+def measure_throughput(case: BenchmarkCase, depth: int, parallel: bool, cold: bool, measure_memory: bool, seconds: float, max_nodes: int) -> dict:
+    # The search keeps going after the answer, up to a fixed budget, so throughput and memory are measured over the
+    # same work whether the answer comes after one node or never. Searches that run out of nodes stop earlier.
+    if cold:
+        clear_caches()
+    if measure_memory:
+        tracemalloc.start()
+
+    progress = SearchProgress()
+    start = time.time()
+    search = bruteforce_string_iter(case.puzzle, timeout_stamp=start + seconds, total_iterations=depth, parallel=parallel, progress=progress)
+    for _ in search:
+        if progress.nodes_expanded >= max_nodes:
+            break
+    search.close()
+    elapsed = time.time() - start
+
+    peak_memory = None
+    if measure_memory:
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return {
+        "throughput_nodes": progress.nodes_expanded,
+        "throughput_elapsed": elapsed,
+        "nodes_per_second": progress.nodes_expanded / max(elapsed, 1e-6),
+        "peak_memory": peak_memory,
+    }
+
+def run_case(case: BenchmarkCase, timeout: float, depth: int, parallel: bool, cold: bool, measure_memory: bool, repeat: int, throughput_seconds: float, throughput_nodes: int) -> dict:
+    # the time to answer is the median of several runs, most puzzles take about a millisecond
+    runs = [time_case(case, timeout, depth, parallel, cold) for _ in range(repeat)]
+    solved_runs = sorted([r for r in runs if r["time_to_answer"] is not None], key=lambda r: r["time_to_answer"])
+    solved = len(solved_runs) * 2 > len(runs)
+    median_run = solved_runs[len(solved_runs) // 2] if solved else { "time_to_answer": None, "nodes_to_answer": None, "answer_path": None }
+    return {
+        "name": case.name,
+        "puzzle": case.puzzle,
+        "answer": case.answer,
+        "solved": solved,
+        **median_run,
+        **measure_throughput(case, depth, parallel, cold, measure_memory, throughput_seconds, throughput_nodes),
+    }
+
+def summarize(cases: list[dict]) -> dict:
+    solved = [c for c in cases if c["solved"]]
+    times = [c["time_to_answer"] for c in solved]
+    memory = [c["peak_memory"] for c in cases if c.get("peak_memory") is not None]
+    return {
+        "cases": len(cases),
+        "solved": len(solved),
+        "success_rate": len(solved) / max(len(cases), 1),
+        "median_time_to_answer": statistics.median(times) if len(times) != 0 else None,
+        "mean_time_to_answer": statistics.mean(times) if len(times) != 0 else None,
+        # geometric mean, so a few puzzles with slow nodes do not decide it
+        "nodes_per_second": statistics.geometric_mean([max(c["nodes_per_second"], 1e-6) for c in cases]) if len(cases) != 0 and all(["throughput_nodes" in c for c in cases]) else None,
+        "max_peak_memory": max(memory) if len(memory) != 0 else None,
+    }
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def run_benchmark(timeout: float, depth: int, workers: int, cold: bool, measure_memory: bool, only: str | None, repeat: int, throughput_seconds: float, throughput_nodes: int) -> dict:
+    parallel = workers > 1
+    if parallel:
+        start_bruteforce_pool(workers)
+
+    validate.__wrapped__("warm up")  # loads the lazily built indices outside of the measurements
+
+    cases = []
+    for case in corpus:
+        if only is not None and only not in case.name:
+            continue
+        result = run_case(case, timeout, depth, parallel, cold, measure_memory, repeat, throughput_seconds, throughput_nodes)
+        status = f"{result['time_to_answer']:7.3f} s {result['nodes_to_answer']:5} nodes" if result["solved"] else "  failed             "
+        memory = f"  {result['peak_memory'] / 1e6:7.1f} MB" if result["peak_memory"] is not None else ""
+        print(f"  {case.name:<28} {status}  {result['nodes_per_second']:8.0f} nodes/s{memory}")
+        cases.append(result)
+
+    return {
+        "format_version": BENCHMARK_FORMAT_VERSION,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "budget": { "timeout": timeout, "depth": depth, "workers": workers, "cold": cold, "memory": measure_memory, "repeat": repeat, "throughput_seconds": throughput_seconds, "throughput_nodes": throughput_nodes },
+        "summary": summarize(cases),
+        "cases": cases,
+    }
+
+
+# Comparison
+
+# differences below these are noise and never count as a regression
+MIN_COMPARED_TIME = 0.002
+MIN_COMPARED_NODES = 3
+
+def format_value(value: float | None) -> str:
+    return "-" if value is None else f"{value:.3f}" if isinstance(value, float) else str(value)
+
+def slower(before: float | None, after: float | None, floor: float, max_slowdown: float) -> bool:
+    return before is not None and after is not None and after > max(before, floor) * max_slowdown
+
+def compare(baseline: dict, current: dict, max_slowdown: float, max_success_drop: float, max_throughput_drop: float, max_memory_growth: float) -> list[str]:
+    # returns the regressions, an empty list if current is at least as good as baseline within the thresholds
+    if baseline["budget"] != current["budget"]:
+        print(f"Warning: budgets differ, {baseline['budget']} vs {current['budget']}")
+
+    # only puzzles in both runs are compared, so runs with --only or an extended corpus still line up
+    current_cases = { c["name"]: c for c in current["cases"] }
+    pairs = [(b, current_cases[b["name"]]) for b in baseline["cases"] if b["name"] in current_cases]
+
+    # The time to answer of fast puzzles is mostly timer noise, the nodes expanded before the answer are exact for a
+    # single process search, so a worse search order shows there.
+    print(f"\n  {'time / nodes to answer':<28} {baseline['revision']:>20} {current['revision']:>20}")
+    regressions = []
+    for before, after in pairs:
+        print(f"  {before['name']:<28} {format_value(before['time_to_answer']):>12} {format_value(before.get('nodes_to_answer')):>7} {format_value(after['time_to_answer']):>12} {format_value(after['nodes_to_answer']):>7}")
+        if before["solved"] and not after["solved"]:
+            regressions.append(f"{before['name']}: no longer solved")
+            continue
+        if slower(before["time_to_answer"], after["time_to_answer"], MIN_COMPARED_TIME, max_slowdown):
+            regressions.append(f"{before['name']}: time to answer {before['time_to_answer']:.3f} s -> {after['time_to_answer']:.3f} s")
+        if slower(before.get("nodes_to_answer"), after["nodes_to_answer"], MIN_COMPARED_NODES, max_slowdown):
+            regressions.append(f"{before['name']}: nodes to answer {before['nodes_to_answer']} -> {after['nodes_to_answer']}")
+
+    b, c = summarize([b for b, _ in pairs]), summarize([c for _, c in pairs])
+    print()
+    for key in ["success_rate", "median_time_to_answer", "nodes_per_second", "max_peak_memory"]:
+        print(f"  {key:<28} {format_value(b[key]):>20} {format_value(c[key]):>20}")
+
+    if c["success_rate"] < b["success_rate"] - max_success_drop:
+        regressions.append(f"success rate dropped from {b['success_rate']:.0%} to {c['success_rate']:.0%}")
+    if slower(b["median_time_to_answer"], c["median_time_to_answer"], MIN_COMPARED_TIME, max_slowdown):
+        regressions.append(f"median time to answer {b['median_time_to_answer']:.3f} s -> {c['median_time_to_answer']:.3f} s")
+    # throughput and memory are measured over the same budget in both runs, older baselines have no throughput
+    if b["nodes_per_second"] is not None and c["nodes_per_second"] is not None and c["nodes_per_second"] < b["nodes_per_second"] * (1.0 - max_throughput_drop):
+        regressions.append(f"throughput {b['nodes_per_second']:.0f} -> {c['nodes_per_second']:.0f} nodes/s")
+    if b["max_peak_memory"] is not None and c["max_peak_memory"] is not None and c["max_peak_memory"] > b["max_peak_memory"] * max_memory_growth:
+        regressions.append(f"peak memory {b['max_peak_memory'] / 1e6:.1f} MB -> {c['max_peak_memory'] / 1e6:.1f} MB")
+    return regressions
+
+def speedup(single: float | None, parallel: float | None) -> str:
+    return "-" if single is None or parallel is None or parallel == 0.0 else f"{single / parallel:.2f}x"
+
+def compare_scaling(single: dict, parallel: dict) -> None:
+    # Time to answer and throughput of the same puzzles in a single process and in the pool. Only the caches of this
+    # process are cleared between runs, the workers keep theirs.
+    workers = parallel["budget"]["workers"]
+    parallel_cases = { c["name"]: c for c in parallel["cases"] }
+    print(f"\n  {'time to answer':<28} {'1 worker':>10} {f'{workers} workers':>10} {'speedup':>8}")
+    for before in single["cases"]:
+        after = parallel_cases[before["name"]]
+        print(f"  {before['name']:<28} {format_value(before['time_to_answer']):>10} {format_value(after['time_to_answer']):>10} {speedup(before['time_to_answer'], after['time_to_answer']):>8}")
+
+    b, c = single["summary"], parallel["summary"]
+    print()
+    print(f"  {'solved':<28} {b['solved']:>10} {c['solved']:>10}")
+    print(f"  {'median_time_to_answer':<28} {format_value(b['median_time_to_answer']):>10} {format_value(c['median_time_to_answer']):>10} {speedup(b['median_time_to_answer'], c['median_time_to_answer']):>8}")
+    print(f"  {'nodes_per_second':<28} {b['nodes_per_second']:>10.0f} {c['nodes_per_second']:>10.0f} {speedup(c['nodes_per_second'], b['nodes_per_second']):>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bruteforce benchmark over a corpus of encoded puzzles")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds per puzzle")
+    parser.add_argument("--depth", type=int, default=4, help="maximum number of chained transforms")
+    parser.add_argument("--workers", type=int, default=1, help="search in a pool of this many processes (memory is only measured in this process)")
+    parser.add_argument("--scaling", type=int, metavar="WORKERS", help="run in a single process and then in a pool of this many processes and compare")
+    parser.add_argument("--warm", action="store_true", help="keep the transform and verdict caches between puzzles")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc, it slows the search down")
+    parser.add_argument("--only", help="only run puzzles whose name contains this")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per puzzle, the median time to answer counts")
+    parser.add_argument("--throughput-seconds", type=float, default=1.0, help="budget per puzzle for measuring nodes/s and memory")
+    parser.add_argument("--throughput-nodes", type=int, default=500, help="node budget per puzzle for measuring nodes/s and memory")
+    parser.add_argument("--output", help="write the results as json")
+    parser.add_argument("--compare", help="json results of an earlier run, exits with 1 on regressions")
+    parser.add_argument("--max-slowdown", type=float, default=1.25, help="allowed factor on the time to answer")
+    parser.add_argument("--max-success-drop", type=float, default=0.0, help="allowed drop of the success rate")
+    parser.add_argument("--max-throughput-drop", type=float, default=0.2, help="allowed relative drop of nodes/s")
+    parser.add_argument("--max-memory-growth", type=float, default=1.25, help="allowed factor on the peak memory")
+    args = parser.parse_args()
+
+    print(f"Running {len([c for c in corpus if args.only is None or args.only in c.name])} puzzles, {args.timeout} s and depth {args.depth} each")
+    if args.scaling is not None:
+        print("Single process:")
+        single = run_benchmark(args.timeout, args.depth, 1, not args.warm, not args.no_memory, args.only, args.repeat, args.throughput_seconds, args.throughput_nodes)
+        print(f"Pool of {args.scaling} workers:")
+        parallel = run_benchmark(args.timeout, args.depth, args.scaling, not args.warm, not args.no_memory, args.only, args.repeat, args.throughput_seconds, args.throughput_nodes)
+        compare_scaling(single, parallel)
+        sys.exit(0)
+
+    report = run_benchmark(args.timeout, args.depth, args.workers, not args.warm, not args.no_memory, args.only, args.repeat, args.throughput_seconds, args.throughput_nodes)
+    summary = report["summary"]
+    print(f"Solved {summary['solved']}/{summary['cases']}, median time to answer {format_value(summary['median_time_to_answer'])} s, {summary['nodes_per_second']:.0f} nodes/s")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.max_slowdown, args.max_success_drop, args.max_throughput_drop, args.max_memory_growth)
+        if len(regressions) != 0:
+            print("\nRegressions:")
+            for r in regressions:
+                print(f"  {r}")
+            sys.exit(1)
+        print("\nNo regressions")
@@ -1,6 +1,58 @@
-from dictionary import dictionary_all, dictionary_popular, T9LookupTree
+from collections.abc import Callable, Iterable, Iterator
+from itertools import chain
+from string import ascii_lowercase, ascii_uppercase
+
+from cryptanalysis import crack_vigenere, is_substitution_key, is_vigenere_key, letter_codes, solve_substitution, substitution_table, vigenere_shift, word_weights
+from dictionary import dictionary_all, dictionary_popular, get_code_lookup_tree, get_language_model, get_t9_lookup_tree
+
+# Bulk conversion
+#
+# Texts of any length are converted as a stream of pieces. Pieces are cut on symbol boundaries, so converting them
+# one by one gives the same text as converting the whole input at once, with memory bounded by the piece size.
+
+BULK_CHUNK_SIZE = 1 << 16
+BULK_KEY_SAMPLE = 2000  # characters a solver sees when the key asks for the best or for all candidates
+SYMBOL_TAIL = 64  # every cut keeps this much behind it, so the last piece still shows the symbol separators
+
+def symbol_pieces(chunks: Iterable[str], boundary: str, symbol_width: int | None, keep_boundary: bool) -> Iterator[tuple[str, bool]]:
+    # (piece, whether it was cut at a boundary), the boundary character stays at the end of the piece if keep_boundary.
+    # Input without boundaries is cut at a multiple of symbol_width, or anywhere without a width.
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        if len(buffer) < BULK_CHUNK_SIZE:
+            continue
+        cut = buffer.rfind(boundary, 0, len(buffer) - SYMBOL_TAIL)
+        if cut != -1:
+            yield buffer[:cut + 1] if keep_boundary else buffer[:cut], True
+            buffer = buffer[cut + 1:]
+        else:
+            cut = len(buffer) - SYMBOL_TAIL
+            cut -= cut % symbol_width if symbol_width is not None else 0
+            yield buffer[:cut], False
+            buffer = buffer[cut:]
+    if buffer != "":
+        yield buffer, False
+
+# Unspaced codes
+
+# a step budget rather than a deadline, so the result only depends on the input and can be cached, about 0.5 s
+SEGMENTATION_STEPS = 1_500_000
+
+def is_unspaced_code(string: str, symbols: str) -> bool:
+    return len(string) != 0 and all([c in symbols for c in string])
+
+def segment_unspaced(string: str, name: str, codes: dict[str, str], symbols: str, gap: str | None = None) -> list[str]:
+    # the most plausible texts of common words spelled by the code, best first
+    tree = get_code_lookup_tree(dictionary_popular, name, codes, symbols)
+    return tree.decode_unspaced(string, get_language_model(dictionary_popular), max_steps=SEGMENTATION_STEPS, gap=gap)
+
 
 class Cipher:
+    separator: str = ""  # between encoded symbols
+    decoded_separator: str = ""  # what a separator decodes to
+    symbol_width: int | None = None  # length of a symbol in encoded input without separators
+
     def __init__(self, name) -> None:
         self.name = name
 
@@ -10,10 +62,63 @@ class Cipher:
     def decode(self, string: str, key: str | None = None) -> bytes:
         return string.encode("utf-8")
 
+    def char_mapping(self, key: str | None, decoding: bool) -> tuple[Callable[[str], str | None], str] | None:
+        # (output for a single character, None drops it; joiner after every output) if this conversion maps every
+        # character on its own, the output of a text is then its joined outputs without the last joiner
+        return None
+
+    def symbol_mapping(self, key: str | None) -> Callable[[str], str] | None:
+        # output for a single symbol if decoding maps the symbols between separators on their own
+        return None
+
+    def resolve_key(self, sample: str, key: str | None, decoding: bool) -> str | None:
+        # a stream is converted with a single key, keys that ask a solver or for all candidates pick the best one
+        return key
+
+    def advance_key(self, key: str | None, piece: str) -> str | None:
+        # key for the text following piece
+        return key
+
+    def encode_chunks(self, chunks: Iterable[str], key: str | None = None) -> Iterator[str]:
+        chunks = iter(chunks)
+        first = next(chunks, "")
+        key = self.resolve_key(first[:BULK_KEY_SAMPLE], key, decoding=False)
+
+        # plain text is cut after word gaps, symbols of two pieces are joined like the symbols within one
+        previous = ""
+        for piece, _ in symbol_pieces(chain([first], chunks), " ", None, keep_boundary=True):
+            encoded = self.encode(piece.encode("utf-8"), key)
+            if isinstance(encoded, list):
+                raise ValueError(f"{self.name} gives several results for this key, bulk conversion needs a single key")
+            if previous != "" and encoded != "" and not previous.endswith(self.separator) and not encoded.startswith(self.separator):
+                yield self.separator
+            if encoded != "":
+                yield encoded
+                previous = encoded
+            key = self.advance_key(key, piece)
+
+    def decode_chunks(self, chunks: Iterable[str], key: str | None = None) -> Iterator[str]:
+        chunks = iter(chunks)
+        first = next(chunks, "")
+        key = self.resolve_key(first[:BULK_KEY_SAMPLE], key, decoding=True)
+
+        boundary = self.separator if self.separator != "" else " "
+        for piece, at_boundary in symbol_pieces(chain([first], chunks), boundary, self.symbol_width, keep_boundary=self.separator == ""):
+            decoded = self.decode(piece, key)
+            if isinstance(decoded, list):
+                raise ValueError(f"{self.name} gives several results for this input, bulk conversion needs a single key and separated symbols")
+            yield decoded.decode("utf-8")
+            if at_boundary and self.separator != "":
+                yield self.decoded_separator
+            key = self.advance_key(key, piece)
+
 class TextCipher(Cipher):
     def __init__(self) -> None:
         super().__init__("Text")
 
+    def char_mapping(self, key: str | None, decoding: bool) -> tuple[Callable[[str], str | None], str] | None:
+        return lambda c: c, ""
+
     def encode(self, data: bytes, key: str | None = None) -> str:
         return data.decode("utf-8")
     
@@ -21,9 +126,15 @@ class TextCipher(Cipher):
         return string.encode("utf-8")
 
 class HexAsciiCipher(Cipher):
+    separator = " "
+    symbol_width = 2
+
     def __init__(self) -> None:
         super().__init__("Hex")
 
+    def char_mapping(self, key: str | None, decoding: bool) -> tuple[Callable[[str], str | None], str] | None:
+        return (lambda c: hex(ord(c))[2:], " ") if not decoding else None
+
     def encode(self, data: bytes, key: str | None = None) -> str:
         string = data.decode("utf-8")
         out = " ".join([str(hex(ord(c))[2:]) for c in string])
@@ -45,9 +156,15 @@ class HexAsciiCipher(Cipher):
 
 
 class NumbersCipher(Cipher):
+    separator = " "
+    symbol_width = 2
+
     def __init__(self) -> None:
         super().__init__("Numbers")
 
+    def char_mapping(self, key: str | None, decoding: bool) -> tuple[Callable[[str], str | None], str] | None:
+        return (lambda c: str(ord(c) % 32) if c.isalpha() else None, " ") if not decoding else None
+
     def encode(self, data: bytes, key: str | None = None) -> str:
         string = data.decode("utf-8")
         out = " ".join([str(ord(c) % 32) for c in string if c.isalpha()]) # todo: auto split with even length
@@ -68,40 +185,71 @@ class NumbersCipher(Cipher):
 
 
 class CaesarCipher(Cipher):
+    # encoding with key k shifts letters back by k, decoding shifts them forward. Letters keep their case and
+    # everything else is left alone. There is a translate table per shift, ascii text goes through the byte tables,
+    # so all 26 shifts cost about as much as a single shift done per character.
+    byte_tables: list[bytes] = [
+        bytes.maketrans((ascii_lowercase + ascii_uppercase).encode("ascii"), (ascii_lowercase[s:] + ascii_lowercase[:s] + ascii_uppercase[s:] + ascii_uppercase[:s]).encode("ascii"))
+        for s in range(26)
+    ]
+    str_tables: list[dict[int, int]] = [
+        str.maketrans(ascii_lowercase + ascii_uppercase, ascii_lowercase[s:] + ascii_lowercase[:s] + ascii_uppercase[s:] + ascii_uppercase[:s])
+        for s in range(26)
+    ]
+
     def __init__(self) -> None:
         super().__init__("Caesar")
 
-    def shift_char(self, c, shift):
-        if not c.isalpha():
-            return c
-        
-        n = ord(c) % 32
-        sn = (n + shift - 1 + 26) % 26 + 1  # +26 to deal with negative keys, removed by remainder op again
-        return chr(sn + 96)
+    def char_mapping(self, key: str | None, decoding: bool) -> tuple[Callable[[str], str | None], str] | None:
+        if key is None or not key.isnumeric():
+            return None
+        table = self.str_tables[(int(key) if decoding else -int(key)) % 26]
+        return lambda c: c.translate(table), ""
 
+    def shifts(self, string: str, shifts: list[int]) -> list[bytes]:
+        if string.isascii():
+            data = string.encode("ascii")
+            return [data.translate(self.byte_tables[s % 26]) for s in shifts]
+        return [string.translate(self.str_tables[s % 26]).encode("utf-8") for s in shifts]
 
-    def encode(self, data: bytes, key: str | None = "all") -> str | list[str]:
+    def all_shifts(self, string: str, direction: int) -> list[bytes]:
+        # index k is the text shifted by direction * k
+        return self.shifts(string, [direction * k for k in range(26)])
+
+    def ranked(self, shifted: list[bytes]) -> list[bytes]:
+        # all shifts, the most English looking first
+        strings = [s.decode("utf-8") for s in shifted]
+        return [f"{k}: {strings[k]}".encode("utf-8") for k in get_language_model(dictionary_popular).rank(strings)]
+
+    def resolve_key(self, sample: str, key: str | None, decoding: bool) -> str | None:
+        if key is not None and key.isnumeric():
+            return key
+        shifted = [s.decode("utf-8") for s in self.all_shifts(sample, 1 if decoding else -1)]
+        return str(get_language_model(dictionary_popular).rank(shifted)[0])
+
+    # key "all" gives every shift labelled with its key, the most English looking first. Without a key, e.g. in the
+    # bruteforce search, the shifts come unlabelled in the order of their keys.
+
+    def encode(self, data: bytes, key: str | None = None) -> str | list[str]:
+        string = data.decode("utf-8")
+        if key == "all":
+            return [s.decode("utf-8") for s in self.ranked(self.all_shifts(string, -1))]
         if key is None or not key.isnumeric():
-            return [str(self.encode(data, key=str(shift))) for shift in range(0, 26)]  # the str() conversion converts str->str and is only necessary to comfort the type checker
-            #return [f"{shift}: {self.encode(data, key=str(shift))}" for shift in range(0, 26)]
-        else:
-            shift = int(key) * (-1) + 26 if key.isnumeric() else 0
-            string = data.decode("utf-8")
-            #numbers = [ord(c) % 32 for c in string if c.isalpha()]
-            #shifted_numbers = [(n + shift - 1 + 26) % 26 + 1 for n in numbers]
-            #out = "".join([chr(n + 96) for n in shifted_numbers])
-            out = "".join([self.shift_char(c, shift) for c in string])
-            return out
-    
-    def decode(self, string: str, key: str | None = "all") -> bytes | list[bytes]:
+            return [s.decode("utf-8") for s in self.all_shifts(string, -1)]
+        return self.shifts(string, [-int(key)])[0].decode("utf-8")
+
+    def decode(self, string: str, key: str | None = None) -> bytes | list[bytes]:
+        if key == "all":
+            return self.ranked(self.all_shifts(string, 1))
         if key is None or not key.isnumeric():
-            return [str(self.encode(string.encode("utf-8"), key=str(shift * (-1) + 26))).encode("utf-8") for shift in range(0, 26)]
-            #return [f"{shift}: {self.encode(string.encode("utf-8"), key=str(shift * (-1) + 26))}".encode("utf-8") for shift in range(0, 26)]
-        else:
-            return str(self.encode(string.encode("utf-8"), str(int(key) * (-1) + 26))).encode("utf-8")
+            return self.all_shifts(string, 1)
+        return self.shifts(string, [int(key)])[0]
 
 
 class TapCodeCipher(Cipher):
+    separator = " "
+    symbol_width = 2
+
     def __init__(self) -> None:
         super().__init__("Tap")
         self.tap_by_char = {
@@ -114,22 +262,35 @@ class TapCodeCipher(Cipher):
         }
         self.char_by_tap = { self.tap_by_char[k]: k for k in self.tap_by_char.keys() }
 
+    def char_mapping(self, key: str | None, decoding: bool) -> tuple[Callable[[str], str | None], str] | None:
+        return (lambda c: self.tap_by_char.get(c.lower(), "??"), " ") if not decoding else None
+
+    def symbol_mapping(self, key: str | None) -> Callable[[str], str] | None:
+        return lambda s: self.char_by_tap.get(s, "?")
+
     def encode(self, data: bytes, key: str | None = None) -> str:
         string = data.decode("utf-8")
         out = " ".join([(self.tap_by_char[c] if c in self.tap_by_char else "??") for c in string.lower()])
         return out
 
     
-    def decode(self, string: str, key: str | None = None) -> bytes:
+    def decode(self, string: str, key: str | None = None) -> bytes | list[bytes]:
         if not " " in string and len(string) % 2 != 0:
            return "No spaces in string and string of odd length".encode("utf-8")
         
         pairs = string.split(" ") if " " in string else [string[i:i+2] for i in range(0, len(string), 2)]
         out = "".join([(self.char_by_tap[tap] if tap in self.char_by_tap else "?") for tap in pairs])
+
+        # without spaces the letters are read as words too, which also tells c from k
+        if len(pairs) > 1 and is_unspaced_code(string, "12345"):
+            texts = segment_unspaced(string, "tap", self.tap_by_char, "0123456789")
+            return [t.encode("utf-8") for t in texts + ([out] if out not in texts else [])]
         return out.encode("utf-8")
 
 
 class MorseCodeCipher(Cipher):
+    separator = " "
+
     def __init__(self) -> None:
         super().__init__("Morse")
         self.morse_by_char = {
@@ -172,17 +333,30 @@ class MorseCodeCipher(Cipher):
         }
         self.char_by_morse = { self.morse_by_char[k]: k for k in self.morse_by_char.keys() }
 
+    def char_mapping(self, key: str | None, decoding: bool) -> tuple[Callable[[str], str | None], str] | None:
+        return (lambda c: self.morse_by_char.get(c.lower(), "???"), " ") if not decoding else None
+
+    def symbol_mapping(self, key: str | None) -> Callable[[str], str] | None:
+        return lambda s: self.char_by_morse.get(s, "?")
+
     def encode(self, data: bytes, key: str | None = None) -> str:
         string = data.decode("utf-8")
         out = " ".join([(self.morse_by_char[c] if c in self.morse_by_char else "???") for c in string.lower()])
         return out
     
-    def decode(self, string: str, key: str | None = None) -> bytes:
+    def decode(self, string: str, key: str | None = None) -> bytes | list[bytes]:
+        if is_unspaced_code(string, ".-") and string not in self.char_by_morse:
+            texts = segment_unspaced(string, "morse", self.morse_by_char, ".-")
+            if len(texts) != 0:
+                return [t.encode("utf-8") for t in texts]
+
         symbols = string.split(" ")
         out = "".join([(self.char_by_morse[symbol] if symbol in self.char_by_morse else "?") for symbol in symbols])
         return out.encode("utf-8")
 
 class SMSMultiTapCipher(Cipher):
+    separator = " "
+
     def __init__(self) -> None:
         super().__init__("SMS")
         self.mt_by_char = {
@@ -216,24 +390,44 @@ class SMSMultiTapCipher(Cipher):
         }
         self.char_by_mt = { self.mt_by_char[k]: k for k in self.mt_by_char.keys() }
 
+    def char_mapping(self, key: str | None, decoding: bool) -> tuple[Callable[[str], str | None], str] | None:
+        return (lambda c: self.mt_by_char.get(c.lower(), "???"), " ") if not decoding else None
+
+    def symbol_mapping(self, key: str | None) -> Callable[[str], str] | None:
+        return lambda s: self.char_by_mt.get(s, "?")
+
     def encode(self, data: bytes, key: str | None = None) -> str:
         string = data.decode("utf-8")
         out = " ".join([(self.mt_by_char[c] if c in self.mt_by_char else "???") for c in string.lower()])
         return out
     
-    def decode(self, string: str, key: str | None = None) -> bytes:
+    def decode(self, string: str, key: str | None = None) -> bytes | list[bytes]:
+        # run together key presses are read as words, a 0 is a word gap
+        if is_unspaced_code(string, "0123456789") and string not in self.char_by_mt:
+            texts = segment_unspaced(string, "multitap", { c: mt for c, mt in self.mt_by_char.items() if c != " " }, "0123456789", gap="0")
+            if len(texts) != 0:
+                return [t.encode("utf-8") for t in texts]
+
         symbols = string.split(" ")
         out = "".join([(self.char_by_mt[symbol] if symbol in self.char_by_mt else "?") for symbol in symbols])
         return out.encode("utf-8")
 
 
-t9_lookup_tree_all = T9LookupTree(dictionary_all)
-t9_lookup_tree_common = T9LookupTree(dictionary_popular)
+t9_lookup_tree_all = get_t9_lookup_tree(dictionary_all)
+t9_lookup_tree_common = get_t9_lookup_tree(dictionary_popular)
 
 class T9Cipher(Cipher):
+    separator = " "
+    decoded_separator = " "
+
     def __init__(self) -> None:
         super().__init__("T9")
     
+    def char_mapping(self, key: str | None, decoding: bool) -> tuple[Callable[[str], str | None], str] | None:
+        # word gaps stay, the digits of a word follow each other
+        lookup_table = t9_lookup_tree_all.key_lookup
+        return (lambda c: " " if c == " " else str(lookup_table[c.lower()]) if c.lower() in lookup_table else "?", "") if not decoding else None
+
     def decode(self, string: str, key: str | None = None) -> bytes:
         tree = t9_lookup_tree_common if key == "common" else t9_lookup_tree_all
 
@@ -243,6 +437,73 @@ class T9Cipher(Cipher):
         lookup_table = t9_lookup_tree_all.key_lookup
         return " ".join(["".join([str(lookup_table[c]) if c in lookup_table else "?" for c in s]) for s in data.decode("utf-8").lower().split(" ")])
 
-all_ciphers = [TextCipher(), NumbersCipher(), CaesarCipher(), MorseCodeCipher(), TapCodeCipher(), SMSMultiTapCipher(), HexAsciiCipher(), T9Cipher()]
+SUBSTITUTION_SOLVER_SECONDS = 1.5
+substitution_word_weights = word_weights(dictionary_popular)
+
+class SubstitutionCipher(Cipher):
+    # key is the plaintext letter for every cipher letter a-z ("." keeps a letter), without a key the cipher is solved
+    def __init__(self) -> None:
+        super().__init__("Substitution")
+
+    def char_mapping(self, key: str | None, decoding: bool) -> tuple[Callable[[str], str | None], str] | None:
+        if not is_substitution_key(key):
+            return None
+        table = substitution_table(str(key), decrypt=decoding)
+        return lambda c: c.translate(table), ""
+
+    def solve(self, string: str) -> list[str]:
+        results = solve_substitution(string, get_language_model(dictionary_popular), SUBSTITUTION_SOLVER_SECONDS, words=substitution_word_weights, seed=0)
+        return [f"{key}: {plaintext}" for _, key, plaintext in results]
+
+    def resolve_key(self, sample: str, key: str | None, decoding: bool) -> str | None:
+        if is_substitution_key(key):
+            return key
+        results = solve_substitution(sample, get_language_model(dictionary_popular), SUBSTITUTION_SOLVER_SECONDS, top_k=1, words=substitution_word_weights, seed=0)
+        return results[0][1] if len(results) != 0 else "." * 26
+
+    def decode(self, string: str, key: str | None = "auto") -> bytes | list[bytes]:
+        if not is_substitution_key(key):
+            return [s.encode("utf-8") for s in self.solve(string)]
+        return string.translate(substitution_table(str(key))).encode("utf-8")
+
+    def encode(self, data: bytes, key: str | None = "auto") -> str | list[str]:
+        if not is_substitution_key(key):
+            return self.solve(data.decode("utf-8"))
+        return data.decode("utf-8").translate(substitution_table(str(key), decrypt=False))
+
+class VigenereCipher(Cipher):
+    # key is a word of letters, without a key or with "auto" the cipher is cracked
+    def __init__(self) -> None:
+        super().__init__("Vigenère")
+
+    def cracks(self, key: str | None) -> bool:
+        return key == "auto" or not is_vigenere_key(key)
+
+    def crack(self, string: str) -> list[str]:
+        return [f"{key}: {plaintext}" for _, key, plaintext in crack_vigenere(string, get_language_model(dictionary_popular))]
+
+    def resolve_key(self, sample: str, key: str | None, decoding: bool) -> str | None:
+        if not self.cracks(key):
+            return key
+        results = crack_vigenere(sample, get_language_model(dictionary_popular), top_k=1)
+        return results[0][1] if len(results) != 0 else "a"
+
+    def advance_key(self, key: str | None, piece: str) -> str | None:
+        # the key continues where the letters of piece left it
+        offset = len(letter_codes(piece)) % len(str(key))
+        return str(key)[offset:] + str(key)[:offset]
+
+    def decode(self, string: str, key: str | None = "auto") -> bytes | list[bytes]:
+        if self.cracks(key):
+            return [s.encode("utf-8") for s in self.crack(string)]
+        return vigenere_shift(string, str(key), -1).encode("utf-8")
+
+    def encode(self, data: bytes, key: str | None = "auto") -> str | list[str]:
+        if self.cracks(key):
+            return self.crack(data.decode("utf-8"))
+        return vigenere_shift(data.decode("utf-8"), str(key), 1)
+
+
+all_ciphers = [TextCipher(), NumbersCipher(), CaesarCipher(), MorseCodeCipher(), TapCodeCipher(), SMSMultiTapCipher(), HexAsciiCipher(), T9Cipher(), SubstitutionCipher(), VigenereCipher()]
 analysis_ciphers = [NumbersCipher(), CaesarCipher(), MorseCodeCipher(), TapCodeCipher(), SMSMultiTapCipher()]
 
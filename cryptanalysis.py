@@ -0,0 +1,484 @@
+import time
+from collections import Counter
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from math import log
+
+import numpy as np
+
+from language_model import GAP, NGRAM_SYMBOLS, NGramModel, to_symbols
+
+# relative letter frequencies of English text, a-z
+ENGLISH_LETTER_FREQUENCIES = np.array([
+    0.08167, 0.01492, 0.02782, 0.04253, 0.12702, 0.02228, 0.02015, 0.06094, 0.06966, 0.00153, 0.00772, 0.04025, 0.02406,
+    0.06749, 0.07507, 0.01929, 0.00095, 0.05987, 0.06327, 0.09056, 0.02758, 0.00978, 0.02360, 0.00150, 0.01974, 0.00074,
+])
+ENGLISH_IOC = float((ENGLISH_LETTER_FREQUENCIES ** 2).sum())  # about 0.066
+RANDOM_IOC = 1 / 26
+
+TEXT_CHUNK_SIZE = 1 << 20
+MAX_GROUP_LENGTH = 4  # longer space separated groups are words, not symbols
+
+# letter code of every utf-32 code unit below 128, -1 for everything else
+letter_by_code = np.full(128, -1, dtype=np.int64)
+letter_by_code[ord("a"):ord("z") + 1] = np.arange(26)
+letter_by_code[ord("A"):ord("Z") + 1] = np.arange(26)
+
+
+def letter_codes(text: str) -> np.ndarray:
+    units = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    codes = letter_by_code[np.minimum(units, 127)]
+    codes[units >= 128] = -1
+    return codes[codes >= 0]
+
+
+class TextStatistics:
+    # Counts everything in one pass over the text, which may come in chunks of any size. Symbols are the characters of
+    # the text, or the space separated groups if the text looks like Morse code, numbers or tap code (no group longer
+    # than MAX_GROUP_LENGTH in the first chunk). Letter n-grams, index of coincidence and chi-squared are over a-z.
+    grouped: bool | None
+    symbol_counts: Counter[str]
+    group_bigram_counts: Counter[tuple[str, str]]
+    group_trigram_counts: Counter[tuple[str, str, str]]
+    letter_counts: np.ndarray  # 26
+    bigram_counts: np.ndarray  # 26 * 26
+    trigram_counts: np.ndarray  # 26 * 26 * 26
+
+    def __init__(self) -> None:
+        self.grouped = None
+        self.symbol_counts = Counter()
+        self.group_bigram_counts = Counter()
+        self.group_trigram_counts = Counter()
+        self.letter_counts = np.zeros(26, dtype=np.int64)
+        self.bigram_counts = np.zeros(26 ** 2, dtype=np.int64)
+        self.trigram_counts = np.zeros(26 ** 3, dtype=np.int64)
+        self._pending_group = ""  # a group may continue in the next chunk
+        self._previous_groups: list[str] = []
+        self._previous_letters = np.zeros(0, dtype=np.int64)
+
+    def update(self, chunk: str) -> None:
+        if self.grouped is None:
+            self.grouped = " " in chunk.strip() and all([len(g) <= MAX_GROUP_LENGTH for g in chunk.split()])
+
+        if self.grouped:
+            self._update_groups(chunk)
+        else:
+            self.symbol_counts.update(chunk)
+        self._update_letters(chunk)
+
+    def _update_groups(self, chunk: str) -> None:
+        # case insensitive, like the characters of text
+        text = self._pending_group + chunk.lower()
+        groups = text.split()
+        if len(text) != 0 and not text[-1].isspace() and len(groups) != 0:
+            self._pending_group = groups.pop()
+        else:
+            self._pending_group = ""
+        self._count_groups(groups)
+
+    def _count_groups(self, groups: list[str]) -> None:
+        self.symbol_counts.update(groups)
+        # the n-grams that end in a new group, the carried groups only start them
+        window = self._previous_groups + groups
+        bigram_window = window[-(len(groups) + 1):]
+        self.group_bigram_counts.update(zip(bigram_window, bigram_window[1:]))
+        self.group_trigram_counts.update(zip(window, window[1:], window[2:]))
+        self._previous_groups = window[-2:]
+
+    def _update_letters(self, chunk: str) -> None:
+        codes = letter_codes(chunk)
+        self.letter_counts += np.bincount(codes, minlength=26)
+
+        # n-grams also run across chunk borders, each is counted with the chunk of its last letter
+        window = np.concatenate([self._previous_letters, codes])
+        bigram_window = window[-(len(codes) + 1):]
+        if len(bigram_window) >= 2:
+            self.bigram_counts += np.bincount(bigram_window[:-1] * 26 + bigram_window[1:], minlength=26 ** 2)
+        if len(window) >= 3:
+            self.trigram_counts += np.bincount((window[:-2] * 26 + window[1:-1]) * 26 + window[2:], minlength=26 ** 3)
+        self._previous_letters = window[-2:]
+
+    def finish(self) -> "TextStatistics":
+        if self._pending_group != "":
+            self._count_groups([self._pending_group])
+            self._pending_group = ""
+        return self
+
+    # Results
+
+    def symbol_frequencies(self) -> dict[str, int]:
+        # case insensitive, text of words only counts letters and digits
+        if self.grouped:
+            return dict(self.symbol_counts)
+        words = any([s.isspace() for s in self.symbol_counts])
+        frequencies = Counter()
+        for s, n in self.symbol_counts.items():
+            if not s.isspace() and (not words or s.isalnum()):
+                frequencies[s.lower()] += n
+        return dict(frequencies)
+
+    def entropy(self) -> float:
+        counts = np.array(list(self.symbol_frequencies().values()), dtype=np.float64)
+        if len(counts) == 0:
+            return 0.0
+        probs = counts / counts.sum()
+        return float(-(probs * np.log2(probs)).sum())
+
+    def index_of_coincidence(self) -> float | None:
+        # over letters, or over the groups of grouped text (every group stands for one letter there)
+        counts = self.letter_counts if not self.grouped else np.array(list(self.symbol_frequencies().values()), dtype=np.int64)
+        total = int(counts.sum())
+        if total < 2:
+            return None
+        return float((counts * (counts - 1)).sum() / (total * (total - 1)))
+
+    def chi_squared(self) -> float | None:
+        # against English letter frequencies, lower is closer
+        total = int(self.letter_counts.sum())
+        if total == 0:
+            return None
+        expected = ENGLISH_LETTER_FREQUENCIES * total
+        return float(((self.letter_counts - expected) ** 2 / expected).sum())
+
+    def top_bigrams(self, limit: int = 10) -> list[tuple[str, int]]:
+        if self.grouped:
+            return [(" ".join(g), n) for g, n in self.group_bigram_counts.most_common(limit)]
+        return self._top_ngrams(self.bigram_counts, 2, limit)
+
+    def top_trigrams(self, limit: int = 10) -> list[tuple[str, int]]:
+        if self.grouped:
+            return [(" ".join(g), n) for g, n in self.group_trigram_counts.most_common(limit)]
+        return self._top_ngrams(self.trigram_counts, 3, limit)
+
+    @staticmethod
+    def _top_ngrams(counts: np.ndarray, n: int, limit: int) -> list[tuple[str, int]]:
+        ngrams = []
+        for code in np.argsort(-counts, kind="stable")[:limit]:
+            if counts[code] == 0:
+                break
+            ngram = "".join([chr(97 + int(code) // 26 ** (n - 1 - i) % 26) for i in range(n)])
+            ngrams.append((ngram, int(counts[code])))
+        return ngrams
+
+
+def analyze_chunks(chunks: Iterable[str]) -> TextStatistics:
+    stats = TextStatistics()
+    for chunk in chunks:
+        stats.update(chunk)
+    return stats.finish()
+
+def text_chunks(text: str, chunk_size: int = TEXT_CHUNK_SIZE) -> Iterator[str]:
+    for start in range(0, len(text), chunk_size):
+        yield text[start:start + chunk_size]
+
+def file_chunks(filename: str, chunk_size: int = TEXT_CHUNK_SIZE) -> Iterator[str]:
+    with open(filename, encoding="utf-8", errors="replace") as f:
+        for chunk in iter(lambda: f.read(chunk_size), ""):
+            yield chunk
+
+def analyze_text(text: str) -> TextStatistics:
+    return analyze_chunks(text_chunks(text))
+
+
+def describe_statistics(stats: TextStatistics) -> str:
+    lines = []
+    ioc = stats.index_of_coincidence()
+    if ioc is not None:
+        # monoalphabetic ciphers and transpositions keep the IoC of the language, polyalphabetic ones flatten it
+        closer_to = "English, monoalphabetic or transposition" if abs(ioc - ENGLISH_IOC) < abs(ioc - RANDOM_IOC) else "random, polyalphabetic or random data"
+        lines.append(f"Index of coincidence: {ioc:.4f} (English {ENGLISH_IOC:.4f}, random {RANDOM_IOC:.4f}), closer to {closer_to}")
+    chi = stats.chi_squared()
+    if chi is not None and not stats.grouped:
+        lines.append(f"Chi-squared against English: {chi:.1f} ({int(stats.letter_counts.sum())} letters)")
+    bigrams, trigrams = stats.top_bigrams(), stats.top_trigrams()
+    if len(bigrams) != 0:
+        lines.append("Bigrams: " + ", ".join([f"{g} ({n})" for g, n in bigrams]))
+    if len(trigrams) != 0:
+        lines.append("Trigrams: " + ", ".join([f"{g} ({n})" for g, n in trigrams]))
+    return "\n\n".join(lines)
+
+
+# Monoalphabetic substitution solver
+#
+# Hill climbing over keys with random restarts. A key maps every cipher letter to a plaintext letter, the gap symbol
+# of the language model always maps to itself. Keys are scored by the quadgram log probabilities of the language
+# model, counted once per distinct quadgram of the ciphertext, so a score is one gather and one dot product no
+# matter how long the text is. All swaps of two letters of a key are scored together in one batch.
+
+SUBSTITUTION_RESTART_SWAPS = 3  # every other restart perturbs the best key so far instead of starting over
+SUBSTITUTION_POLISH_SHARE = 0.3  # of the time budget, for polishing the best keys against the dictionary
+SUBSTITUTION_WORD_WEIGHT = 2.0  # a plaintext of common words only gains up to this much on the quadgram score
+
+def substitution_key_string(key: np.ndarray, present: np.ndarray) -> str:
+    # plaintext letter for every cipher letter a-z, "." for letters that are not in the ciphertext
+    return "".join([chr(97 + int(key[i])) if present[i] else "." for i in range(26)])
+
+def substitution_table(key: str, decrypt: bool = True) -> dict[int, str]:
+    table = {}
+    for i, c in enumerate(key.lower()):
+        if not "a" <= c <= "z":
+            continue
+        source, target = (chr(97 + i), c) if decrypt else (c, chr(97 + i))
+        table[ord(source)] = target
+        table[ord(source.upper())] = target.upper()
+    return table
+
+def word_weights(dictionary: Sequence[str]) -> dict[str, float]:
+    # for a dictionary sorted by frequency, the most common word counts 1, the rarest 0.5
+    scale = 0.5 / log(len(dictionary) + 1)
+    return { w: 1.0 - scale * log(rank + 1) for rank, w in reversed(list(enumerate(dictionary))) }
+
+def is_substitution_key(key: str | None) -> bool:
+    return key is not None and len(key) == 26 and all([c == "." or "a" <= c <= "z" for c in key.lower()])
+
+def solve_substitution(text: str, model: NGramModel, time_budget: float, top_k: int = 5, words: dict[str, float] | None = None, seed: int | None = None) -> list[tuple[float, str, str]]:
+    # (score, key, plaintext), best first. words maps known words to how much they count per letter (common words
+    # more), with them the best keys are polished until the plaintext reads as words.
+    deadline = time.perf_counter() + time_budget
+    rng = np.random.default_rng(seed)
+
+    symbols = to_symbols(" " + text + " ")
+    present = np.bincount(symbols[symbols != GAP], minlength=27)[:26] > 0
+    if present.sum() < 2 or len(symbols) < 4:
+        return []
+
+    codes, counts = np.unique(NGramModel.ngram_codes(symbols, 4), return_counts=True)
+    positions = [codes // NGRAM_SYMBOLS ** (3 - i) % NGRAM_SYMBOLS for i in range(4)]
+    counts = counts.astype(np.float32) / counts.sum()
+
+    def score_keys(keys: np.ndarray) -> np.ndarray:
+        plain = keys[:, positions[0]]
+        for p in positions[1:]:
+            plain = plain * NGRAM_SYMBOLS + keys[:, p]
+        return model.quadgrams[plain] @ counts
+
+    # cipher words in lowercase letters, for the dictionary polish
+    cipher_words = " ".join(["".join([c for c in w if "a" <= c <= "z"]) for w in text.lower().split()])
+    num_letters = max(len(cipher_words.replace(" ", "")), 1)
+    polish = words is not None and " " in cipher_words.strip()
+
+    def word_scores(keys: np.ndarray) -> np.ndarray:
+        scores = np.zeros(len(keys))
+        for k, key in enumerate(keys):
+            plain = cipher_words.translate({ 97 + i: 97 + int(key[i]) for i in range(26) })
+            scores[k] = sum([len(w) * words.get(w, 0.0) for w in plain.split(" ")]) / num_letters
+        return scores
+
+    # swapping the images of two letters that are both missing from the text changes nothing
+    pairs = np.array([(i, j) for i in range(26) for j in range(i + 1, 26) if present[i] or present[j]])
+    rows = np.arange(len(pairs))
+
+    def climb(key: np.ndarray, score_fn: Callable[[np.ndarray], np.ndarray], stop: float) -> tuple[np.ndarray, float]:
+        # steepest ascent, all swaps of the current key are scored in one batch
+        score = float(score_fn(key[None, :])[0])
+        while time.perf_counter() < stop:
+            candidates = np.repeat(key[None, :], len(pairs), axis=0)
+            candidates[rows, pairs[:, 0]] = key[pairs[:, 1]]
+            candidates[rows, pairs[:, 1]] = key[pairs[:, 0]]
+            scores = score_fn(candidates)
+            best = int(np.argmax(scores))
+            if scores[best] <= score:
+                break
+            key, score = candidates[best], float(scores[best])
+        return key, score
+
+    present_letters = np.flatnonzero(present)
+
+    def perturb(key: np.ndarray) -> np.ndarray:
+        key = key.copy()
+        for _ in range(SUBSTITUTION_RESTART_SWAPS):
+            i, j = rng.choice(present_letters, size=2, replace=False) if len(present_letters) >= 2 else rng.choice(26, size=2, replace=False)
+            key[i], key[j] = key[j], key[i]
+        return key
+
+    # the first start maps cipher letters to English letters of the same frequency rank
+    letter_counts = np.bincount(symbols[symbols != GAP], minlength=27)[:26]
+    key = np.empty(NGRAM_SYMBOLS, dtype=np.int64)
+    key[np.argsort(-letter_counts, kind="stable")] = np.argsort(-ENGLISH_LETTER_FREQUENCIES, kind="stable")
+    key[GAP] = GAP
+
+    found: dict[bytes, tuple[float, np.ndarray]] = {}
+    best_key, best_score = key, float("-inf")
+    climb_deadline = deadline - time_budget * SUBSTITUTION_POLISH_SHARE if polish else deadline
+    restarts = 0
+    while True:
+        key, score = climb(key, score_keys, climb_deadline)
+
+        # keys only differing in letters missing from the text decrypt to the same plaintext
+        found[np.where(present, key[:26], -1).tobytes()] = (score, key)
+        if score > best_score:
+            best_key, best_score = key, score
+
+        if time.perf_counter() >= climb_deadline:
+            break
+        restarts += 1
+        if restarts % 2 == 1:
+            key = perturb(best_key)
+        else:
+            key = np.concatenate([rng.permutation(26), [GAP]])
+
+    ranked = [key for _, key in sorted(found.values(), key=lambda f: -f[0])[:top_k]]
+    if polish:
+        # iterated local search from the best keys, a few letters are often in a cycle no single swap can fix
+        def combined_scores(keys: np.ndarray) -> np.ndarray:
+            return score_keys(keys) + SUBSTITUTION_WORD_WEIGHT * word_scores(keys)
+
+        polished = {}
+        for key in ranked:
+            key, score = climb(key, combined_scores, deadline)
+            polished[np.where(present, key[:26], -1).tobytes()] = (score, key)
+        best_score, best_key = max(polished.values(), key=lambda p: p[0])
+        while time.perf_counter() < deadline:
+            key, score = climb(perturb(best_key), combined_scores, deadline)
+            polished[np.where(present, key[:26], -1).tobytes()] = (score, key)
+            if score > best_score:
+                best_score, best_key = score, key
+        ranked = [key for _, key in sorted(polished.values(), key=lambda p: -p[0])[:top_k]]
+
+    results = []
+    for key in ranked:
+        score = float(score_keys(key[None, :])[0]) + (SUBSTITUTION_WORD_WEIGHT * float(word_scores(key[None, :])[0]) if polish else 0.0)
+        key_string = substitution_key_string(key, present)
+        results.append((score, key_string, text.translate(substitution_table(key_string))))
+    return sorted(results, key=lambda r: -r[0])
+
+
+# Vigenère cracker
+#
+# Periods are ranked by the mean index of coincidence of their columns and by Kasiski evidence (how many distances
+# between repeated trigrams they divide). Every column of the best periods is solved as a Caesar shift by
+# chi-squared against English, all columns and shifts at once, and the plaintexts are ranked by the language model.
+
+VIGENERE_MAX_PERIOD = 30
+VIGENERE_MIN_COLUMN_LETTERS = 5  # longer periods fit any text
+VIGENERE_PERIOD_CANDIDATES = 8
+KASISKI_WEIGHT = 2.0
+VIGENERE_REFINED_KEYS = 3
+VIGENERE_REFINE_PASSES = 2
+
+# expected letter distribution of a column shifted by s, row s
+shifted_english = np.array([np.roll(ENGLISH_LETTER_FREQUENCIES, s) for s in range(26)])
+
+def vigenere_shift(text: str, key: str, direction: int) -> str:
+    # shifts letters only, keeps case and advances the key only on letters
+    shifts = [ord(c) - 97 for c in key.lower() if "a" <= c <= "z"]
+    if len(shifts) == 0:
+        return text
+    out = []
+    position = 0
+    for c in text:
+        if "a" <= c <= "z" or "A" <= c <= "Z":
+            base = 97 if c >= "a" else 65
+            out.append(chr((ord(c) - base + direction * shifts[position % len(shifts)]) % 26 + base))
+            position += 1
+        else:
+            out.append(c)
+    return "".join(out)
+
+def column_counts(codes: np.ndarray, period: int) -> np.ndarray:
+    return np.bincount(np.arange(len(codes)) % period * 26 + codes, minlength=period * 26).reshape(period, 26)
+
+def period_evidence(codes: np.ndarray, max_period: int) -> np.ndarray:
+    # evidence for every period 1..max_period (index 0 unused), higher is more likely
+    evidence = np.full(max_period + 1, -np.inf)
+    for period in range(1, max_period + 1):
+        counts = column_counts(codes, period)
+        sizes = counts.sum(axis=1)
+        iocs = (counts * (counts - 1)).sum(axis=1) / np.maximum(sizes * (sizes - 1), 1)
+        evidence[period] = (iocs.mean() - RANDOM_IOC) / (ENGLISH_IOC - RANDOM_IOC)
+
+    # distances between consecutive occurrences of the same trigram, a stable sort keeps positions ascending
+    if len(codes) >= 6:
+        trigrams = (codes[:-2] * 26 + codes[1:-1]) * 26 + codes[2:]
+        order = np.argsort(trigrams, kind="stable")
+        repeated = trigrams[order][1:] == trigrams[order][:-1]
+        distances = (order[1:] - order[:-1])[repeated]
+        if len(distances) != 0:
+            periods = np.arange(1, max_period + 1)
+            divided = (distances[None, :] % periods[:, None] == 0).mean(axis=1)
+            evidence[1:] += KASISKI_WEIGHT * (divided - 1 / periods)  # by chance a period divides 1/period of them
+    return evidence
+
+def minimal_key(key: str) -> str:
+    for period in range(1, len(key) + 1):
+        if len(key) % period == 0 and key[:period] * (len(key) // period) == key:
+            return key[:period]
+    return key
+
+def vigenere_decryptions(text: str, codes: np.ndarray, keys: list[str]) -> list[str]:
+    # lowercase decryptions of text under every key, for scoring
+    template = np.frombuffer(text.encode("ascii", "replace").lower(), dtype=np.uint8).copy()
+    positions = np.flatnonzero((template >= 97) & (template <= 122))
+    decryptions = []
+    for key in keys:
+        shifts = np.frombuffer(key.encode("ascii"), dtype=np.uint8).astype(np.int64) - 97
+        template[positions] = (codes - shifts[np.arange(len(codes)) % len(shifts)]) % 26 + 97
+        decryptions.append(template.tobytes().decode("ascii"))
+    return decryptions
+
+def refine_vigenere_key(text: str, codes: np.ndarray, key: str, model: NGramModel) -> tuple[float, str]:
+    # chi-squared misreads short columns, every key letter is retried with all 26 shifts against the language model
+    best_score = float(model.score_batch(vigenere_decryptions(text, codes, [key]))[0])
+    for _ in range(VIGENERE_REFINE_PASSES):
+        improved = False
+        for i in range(len(key)):
+            keys = [key[:i] + chr(97 + s) + key[i + 1:] for s in range(26)]
+            scores = model.score_batch(vigenere_decryptions(text, codes, keys))
+            best = int(scores.argmax())
+            if scores[best] > best_score + 1e-9:
+                best_score, key, improved = float(scores[best]), keys[best], True
+        if not improved:
+            break
+    return best_score, key
+
+def is_vigenere_key(key: str | None) -> bool:
+    return key is not None and len(key) != 0 and all(["a" <= c <= "z" for c in key.lower()])
+
+def crack_vigenere(text: str, model: NGramModel, max_period: int = VIGENERE_MAX_PERIOD, top_k: int = 5) -> list[tuple[float, str, str]]:
+    # (score, key, plaintext), best first
+    codes = letter_codes(text)
+    max_period = min(max_period, len(codes) // VIGENERE_MIN_COLUMN_LETTERS)
+    if max_period < 1:
+        return []
+
+    evidence = period_evidence(codes, max_period)
+    periods = [int(p) for p in np.argsort(-evidence[1:], kind="stable")[:VIGENERE_PERIOD_CANDIDATES] + 1]
+
+    keys = []
+    for period in periods:
+        counts = column_counts(codes, period)
+        expected = counts.sum(axis=1)[:, None, None] * shifted_english[None, :, :]
+        chi_squared = ((counts[:, None, :] - expected) ** 2 / np.maximum(expected, 1e-9)).sum(axis=2)
+        keys.append("".join([chr(97 + int(s)) for s in chi_squared.argmin(axis=1)]))
+
+    scores = model.score_batch(vigenere_decryptions(text, codes, keys))
+    ranked = [(float(scores[i]), keys[i]) for i in np.argsort(-scores, kind="stable")]
+    ranked[:VIGENERE_REFINED_KEYS] = [refine_vigenere_key(text, codes, key, model) for _, key in ranked[:VIGENERE_REFINED_KEYS]]
+
+    results = {}
+    for score, key in sorted(ranked, key=lambda r: -r[0]):
+        key = minimal_key(key)
+        if key not in results:
+            results[key] = (score, key, vigenere_shift(text, key, -1))
+    return list(results.values())[:top_k]
+
+# Test
+if __name__ == "__main__":
+    # counts over chunks equal the counts over the whole text, wherever the chunk borders fall
+    for text, sizes in [("abcdef", [1, 2, 3, 4, 5]), ("The quick brown fox jumps over the lazy dog, twice!", [1, 2, 3, 7, 16]), ("12 5 12 12 3 5 12 8 3 12", [5, 6, 7, 9])]:
+        whole = analyze_text(text)
+        for size in sizes:
+            chunked = analyze_chunks(text_chunks(text, size))
+            assert (chunked.letter_counts == whole.letter_counts).all(), (text, size)
+            assert (chunked.bigram_counts == whole.bigram_counts).all(), (text, size)
+            assert (chunked.trigram_counts == whole.trigram_counts).all(), (text, size)
+            if whole.grouped:
+                assert chunked.grouped, (text, size)
+                assert chunked.group_bigram_counts == whole.group_bigram_counts, (text, size)
+                assert chunked.group_trigram_counts == whole.group_trigram_counts, (text, size)
+    assert analyze_chunks(["abc", "def"]).top_bigrams() == [(b, 1) for b in ["ab", "bc", "cd", "de", "ef"]]
+    # groups are case insensitive too
+    mixed = analyze_chunks(text_chunks("A b a B A b", 4))
+    assert mixed.symbol_frequencies() == { "a": 3, "b": 3 }
+    assert mixed.top_bigrams() == [("a b", 3), ("b a", 2)]
+    assert analyze_text("A b a").symbol_frequencies() == { "a": 2, "b": 1 }
+    print("ok")
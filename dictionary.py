@@ -1,21 +1,26 @@
 import re
+from collections.abc import Sequence
 
+import numpy as np
 
-with open("words_sorted.txt") as f:
-    dictionary_all = [l.replace("\n", "") for l in f.readlines()]
+from language_model import NGramModel
+from lexicon import Lexicon, lexicon_registry
+from word_search import LetterCountIndex, PatternIndex, RegexSearchIndex, ShiftSignatureIndex, WordAutomaton
 
-with open("words_popular.txt") as f:
-    dictionary_popular = [l.replace("\n", "") for l in f.readlines()]
+
+dictionary_all = Lexicon.load("words_sorted.txt")
+dictionary_popular = Lexicon.load("words_popular.txt")
 
 class AnagramLookupTable:
     table: dict[str, list[str]]
+    letter_counts: LetterCountIndex  # over the sorted keys of table
 
-    def __init__(self, dictionary: list[str]) -> None:
+    def __init__(self, dictionary: Sequence[str]) -> None:
         print(f"Building anagram lookup table for {len(dictionary)} words...")
         self.build_table(dictionary)
         print(f"Lookup table built, {len(self.table)} entries")
 
-    def build_table(self, dictionary: list[str]):
+    def build_table(self, dictionary: Sequence[str]):
         self.table = {}
 
         for word in dictionary:
@@ -25,6 +30,8 @@ class AnagramLookupTable:
                 self.table[word_sorted] = []
             
             self.table[word_sorted].append(word)
+
+        self.letter_counts = LetterCountIndex(list(self.table.keys()))
     
     def sort_word(self, word: str) -> str:
         return "".join(sorted(word))
@@ -32,12 +39,9 @@ class AnagramLookupTable:
     def lookup(self, word: str) -> list[str] | None:
         word = word.lower()
         if "?" in word:
-            results = []
-            for c in [chr(i + 97) for i in range(26)]:
-                discovered = self.lookup(word.replace("?", c, 1))
-                if discovered is not None:
-                    results += discovered
-            return list(set(results)) if len(results) != 0 else None
+            keys = self.letter_counts.find(word.replace("?", ""), blanks=word.count("?"))
+            results = [w for key in keys for w in self.table[key]]
+            return results if len(results) != 0 else None
 
         sorted_word = self.sort_word(word)
         if sorted_word in self.table:
@@ -45,88 +49,291 @@ class AnagramLookupTable:
         else:
             return None
 
+    def lookup_partial(self, word: str) -> list[str] | None:
+        word = word.lower()
+        keys = self.letter_counts.find(word.replace("?", ""), blanks=word.count("?"), partial=True)
+        results = [w for key in keys for w in self.table[key]]
+        return results if len(results) != 0 else None
+
+
+def get_anagram_lookup_table(dictionary: Lexicon) -> AnagramLookupTable:
+    return lexicon_registry.get("anagram", dictionary, AnagramLookupTable)
+
+def get_word_set(dictionary: Lexicon) -> frozenset[str]:
+    # hashed membership for hot loops, the lexicon itself answers `in` by binary search
+    return lexicon_registry.get("set", dictionary, frozenset)
+
 
-def find_words_by_regex(regex: re.Pattern, dictionary: list[str]) -> list[str]:
+def get_regex_search_index(dictionary: Lexicon) -> RegexSearchIndex:
+    return lexicon_registry.get("regex", dictionary, RegexSearchIndex)
+
+def find_words_by_regex(regex: re.Pattern, dictionary: Sequence[str]) -> list[str]:
+    if isinstance(dictionary, Lexicon):
+        return get_regex_search_index(dictionary).search(regex, dictionary)
     return [word for word in dictionary if regex.fullmatch(word)]
 
 
-from typing import Self
+def get_language_model(dictionary: Lexicon) -> NGramModel:
+    return lexicon_registry.get("ngram", dictionary, NGramModel)
+
+
+def get_word_automaton(dictionary: Lexicon) -> WordAutomaton:
+    return lexicon_registry.get("automaton", dictionary, WordAutomaton)
+
+def get_shift_signature_index(dictionary: Lexicon) -> ShiftSignatureIndex:
+    return lexicon_registry.get("shift", dictionary, ShiftSignatureIndex)
+
+
+def get_pattern_index(dictionary: Lexicon) -> PatternIndex:
+    return lexicon_registry.get("pattern", dictionary, PatternIndex)
+
+def find_words(search_string: str, dictionary: Lexicon, must_contain: str = "", must_not_contain: str = "") -> list[str]:
+    # fixed length patterns with known letters take the bitset fast path, everything else is a regular expression.
+    # The bitsets only know a-z, letter filters with other characters take the regular expression path too.
+    if PatternIndex.fits(search_string) and PatternIndex.fits_letters(must_contain + must_not_contain):
+        return get_pattern_index(dictionary).search(search_string, dictionary, must_contain, must_not_contain)
+
+    results = find_words_by_regex(re.compile(search_string, re.IGNORECASE), dictionary)
+    if must_contain != "" or must_not_contain != "":
+        required, excluded = set(must_contain.lower()) - {" "}, set(must_not_contain.lower()) - {" "}
+        results = [w for w in results if required <= set(w.lower()) and len(excluded & set(w.lower())) == 0]
+    return results
+
+
+from array import array
+from math import log2
 
 class T9LookupTree:
+    # Flat trie over the digit sequences of all words. Words are stored sorted by their digit sequence, so the
+    # words of a node and of its whole subtree are contiguous ranges of the word arrays.
+    key_lookup: dict[str, int] = {
+        "a": 2,
+        "b": 2,
+        "c": 2,
+        "d": 3,
+        "e": 3,
+        "f": 3,
+        "g": 4,
+        "h": 4,
+        "i": 4,
+        "j": 5,
+        "k": 5,
+        "l": 5,
+        "m": 6,
+        "n": 6,
+        "o": 6,
+        "p": 7,
+        "q": 7,
+        "r": 7,
+        "s": 7,
+        "t": 8,
+        "u": 8,
+        "v": 8,
+        "w": 9,
+        "x": 9,
+        "y": 9,
+        "z": 9,
+        "+": 0,
+    }
 
-    class T9TreeNode:
-        children: list[Self | None]
-        words: list[str]
+    children: array  # 10 slots per node, -1 if missing
+    words_end: array  # words ending at node i are words[subtree_start[i]:words_end[i]]
+    subtree_start: array
+    subtree_end: array
 
-        def __init__(self) -> None:
-            self.children = [None for _ in range(10)]
-            self.words = []
-    
-    root: T9TreeNode
-    key_lookup: dict[str, int]
-
-    def __init__(self, dictionary: list[str]) -> None:
-        self.root = self.T9TreeNode()
-        self.key_lookup = {
-            "a": 2,
-            "b": 2,
-            "c": 2,
-            "d": 3,
-            "e": 3,
-            "f": 3,
-            "g": 4,
-            "h": 4,
-            "i": 4,
-            "j": 5,
-            "k": 5,
-            "l": 5,
-            "m": 6,
-            "n": 6,
-            "o": 6,
-            "p": 7,
-            "q": 7,
-            "r": 7,
-            "s": 7,
-            "t": 8,
-            "u": 8,
-            "v": 8,
-            "w": 9,
-            "x": 9,
-            "y": 9,
-            "z": 9,
-            "+": 0,
-        }
+    words: str  # all words joined, sorted by digit sequence
+    word_offsets: array
+    word_ranks: array  # position of the word in the source dictionary, lower is more common for the popular list
 
+    def __init__(self, dictionary: Sequence[str]) -> None:
         print(f"Building T9 lookup tree for {len(dictionary)} words...")
         self.build_tree(dictionary)
-        print(f"Lookup tree built")
+        print(f"Lookup tree built, {len(self.subtree_start)} nodes")
 
+    def to_digits(self, word: str) -> str | None:
+        digits = [self.key_lookup.get(c) for c in word.lower()]
+        return "".join([str(d) for d in digits]) if None not in digits else None
+
+    def build_tree(self, dictionary: Sequence[str]):
+        entries = [(digits, i, word) for i, word in enumerate(dictionary) if len(word) > 0 and (digits := self.to_digits(word)) is not None]
+        entries.sort(key=lambda e: e[0])
+
+        self.children = array("i", [-1] * 10)
+        self.words_end = array("I", [0])
+        self.subtree_start = array("I", [0])
+        self.subtree_end = array("I", [len(entries)])
+
+        self.words = "".join([e[2] for e in entries])
+        self.word_offsets = array("I", [0])
+        for e in entries:
+            self.word_offsets.append(self.word_offsets[-1] + len(e[2]))
+        self.word_ranks = array("I", [e[1] for e in entries])
+
+        path = [0]  # nodes along the digits of the previous word
+        previous = ""
+        for position, (digits, _, _) in enumerate(entries):
+            common = 0
+            while common < min(len(digits), len(previous)) and digits[common] == previous[common]:
+                common += 1
+
+            # the previous word's nodes below the common prefix are complete
+            for node in path[common + 1:]:
+                self.subtree_end[node] = position
+            del path[common + 1:]
+
+            for d in digits[common:]:
+                node = len(self.subtree_start)
+                self.children[10 * path[-1] + int(d)] = node
+                self.children.extend([-1] * 10)
+                self.words_end.append(position)
+                self.subtree_start.append(position)
+                self.subtree_end.append(len(entries))
+                path.append(node)
+
+            self.words_end[path[-1]] = position + 1
+            previous = digits
+
+    def word(self, i: int) -> str:
+        return self.words[self.word_offsets[i]:self.word_offsets[i + 1]]
+
+    def find_node(self, digits: str) -> int:
+        node = 0
+        for d in digits:
+            node = self.children[10 * node + int(d)]
+            if node == -1:
+                break
+        return node
+
+    def words_at(self, node: int) -> list[str]:
+        return [self.word(i) for i in range(self.subtree_start[node], self.words_end[node])]
 
-    def build_tree(self, dictionary: list[str]):
-        for word in dictionary:
-            current = self.root
-            for c in word:
-                n = self.key_lookup[c.lower()] - 1
-                if current.children[n] is None:
-                    current.children[n] = self.T9TreeNode()
-                current = current.children[n]
-
-            current.words.append(word)
-    
     def lookup(self, input: str, multipart: bool = False) -> str:
         if " " in input:
             return " ".join([self.lookup(s, multipart=True) for s in input.split(" ")])
+        if input.endswith("*") and not multipart:
+            return self.lookup_completions(input[:-1])
         if any([not c.isdigit() for c in input]):
             return "Ahoy matey! We cannot sail the high seas of the lookup tree with that input."
-        
-        current = self.root
-        for c in input:
-            current = current.children[int(c) - 1]
-            if current is None:
-                return "No match found"
-        
+
+        node = self.find_node(input)
+        if not multipart and len(input) > 0 and (node == -1 or self.words_end[node] == self.subtree_start[node]):
+            return self.lookup_segmentations(input)
+        if node == -1:
+            return "No match found"
+
         if multipart:
-            return str(current.words)
+            return str(self.words_at(node))
         else:
-            return "\n".join(current.words)
+            return "\n".join(self.words_at(node))
+
+    # Prefix completion
+
+    def complete(self, prefix: str, limit: int = 100) -> list[str]:
+        node = self.find_node(prefix)
+        if node == -1:
+            return []
+        ids = range(self.subtree_start[node], self.subtree_end[node])
+        ids = sorted(ids, key=lambda i: (self.word_offsets[i + 1] - self.word_offsets[i], self.word_ranks[i]))
+        return [self.word(i) for i in ids[:limit]]
+
+    def lookup_completions(self, prefix: str) -> str:
+        if any([not c.isdigit() for c in prefix]):
+            return "Ahoy matey! We cannot sail the high seas of the lookup tree with that input."
+        completions = self.complete(prefix)
+        return "\n".join(completions) if len(completions) != 0 else "No match found"
+
+    # Segmentation of unspaced input
+
+    def word_cost(self, rank: int) -> float:
+        # one unit per word, plus a small penalty for rare words
+        return 1.0 + 0.1 * log2(2 + rank)
+
+    def segment_cost(self, node: int) -> float:
+        return self.word_cost(min([self.word_ranks[i] for i in range(self.subtree_start[node], self.words_end[node])]))
+
+    def segment(self, digits: str, top_k: int = 10, max_steps: int | None = None, gap: str | None = None) -> list[tuple[float, list[int]]]:
+        # best[i] holds the top_k cheapest ways to split digits[:i], as (cost, nodes of the segments). Prefixes
+        # nobody reaches are skipped and every node is costed once. A gap digit separates words without being part
+        # of one. Nothing is found if it takes more than max_steps steps down the tree and segmentations extended, a
+        # budget that gives the same result for the same input, unlike a deadline.
+        best: list[list[tuple[float, list[int]]]] = [[] for _ in range(len(digits) + 1)]
+        best[0] = [(0.0, [])]
+        costs: dict[int, float] = {}
+        steps = 0
+
+        for start in range(len(digits)):
+            if len(best[start]) == 0:
+                continue
+            if max_steps is not None and steps > max_steps:
+                return []
+            if digits[start] == gap:
+                best[start + 1] = sorted(best[start + 1] + best[start], key=lambda b: b[0])[:top_k]
+                continue
+            node = 0
+            for end in range(start + 1, len(digits) + 1):
+                steps += 1
+                node = self.children[10 * node + int(digits[end - 1])] if digits[end - 1] != gap else -1
+                if node == -1:
+                    break
+                if self.words_end[node] == self.subtree_start[node]:
+                    continue
+                if node not in costs:
+                    costs[node] = self.segment_cost(node)
+                steps += len(best[start])
+                best[end] += [(c + costs[node], nodes + [node]) for c, nodes in best[start]]
+                best[end] = sorted(best[end], key=lambda b: b[0])[:top_k]
+
+        return best[len(digits)]
+
+    def lookup_segmentations(self, digits: str) -> str:
+        segmentations = self.segment(digits)
+        if len(segmentations) == 0:
+            return "No match found"
+        return "\n".join([" ".join([self.words_at(node)[0] if len(self.words_at(node)) == 1 else str(self.words_at(node)) for node in nodes]) for _, nodes in segmentations])
+
+def get_t9_lookup_tree(dictionary: Lexicon) -> T9LookupTree:
+    return lexicon_registry.get("t9", dictionary, T9LookupTree)
+
+
+# Segmentation of other unspaced codes
+
+SEGMENTATION_BEAM = 40  # segmentations kept per prefix
+SEGMENTATION_WORD_CHOICES = 3  # words tried for a code several words share
+SEGMENTATION_COST_WEIGHT = 2.0  # the language model only decides between segmentations of about the same cost
+
+class CodeLookupTree(T9LookupTree):
+    # T9 lookup tree over the codes of another cipher, e.g. Morse, where every letter is a string of code symbols.
+    # The i-th of symbols is stored as digit i.
+    symbols: str
+
+    def __init__(self, dictionary: Sequence[str], name: str, codes: dict[str, str], symbols: str) -> None:
+        self.symbols = symbols
+        self.key_lookup = { c: code.translate(self.digit_table()) for c, code in codes.items() }
+        print(f"Building {name} lookup tree for {len(dictionary)} words...")
+        self.build_tree(dictionary)
+        print(f"Lookup tree built, {len(self.subtree_start)} nodes")
+
+    def digit_table(self) -> dict[int, int]:
+        return str.maketrans(self.symbols, "0123456789"[:len(self.symbols)])
+
+    def decode_unspaced(self, code: str, model: NGramModel, top_k: int = 5, max_steps: int | None = None, gap: str | None = None) -> list[str]:
+        # most plausible texts spelled by code, the cheapest segmentations into words are ranked by the language model
+        digits = code.translate(self.digit_table())
+        gap_digit = gap.translate(self.digit_table()) if gap is not None else None
+        segmentations = self.segment(digits, SEGMENTATION_BEAM, max_steps, gap_digit)
+
+        # the most common word of every segment, and every alternative word swapped in on its own
+        costs = {}
+        for _, nodes in segmentations:
+            choices = [[(self.word(i), self.word_cost(self.word_ranks[i])) for i in range(self.subtree_start[node], self.words_end[node])][:SEGMENTATION_WORD_CHOICES] for node in nodes]
+            words = [c[0] for c in choices]
+            candidates = [words] + [words[:i] + [alternative] + words[i + 1:] for i, c in enumerate(choices) for alternative in c[1:]]
+            for text in candidates:
+                costs.setdefault(" ".join([w for w, _ in text]), sum([cost for _, cost in text]))
+
+        texts = list(costs.keys())
+        scores = model.score_batch(texts) - SEGMENTATION_COST_WEIGHT * np.array([costs[t] for t in texts])
+        return [texts[i] for i in np.argsort(-scores, kind="stable")[:top_k]]
 
+def get_code_lookup_tree(dictionary: Lexicon, name: str, codes: dict[str, str], symbols: str) -> CodeLookupTree:
+    return lexicon_registry.get(name, dictionary, lambda d: CodeLookupTree(d, name, codes, symbols))
@@ -1,5 +1,6 @@
-from ciphers import CaesarCipher
-from dictionary import dictionary_popular
+import time
+
+from dictionary import dictionary_popular, get_shift_signature_index, get_word_automaton
 
 class GridResult:
     word: str
@@ -8,52 +9,133 @@ class GridResult:
     orientation: str
     rot: int
     reversed: bool
+    path: list[tuple[int, int]] | None
 
-    def __init__(self, word: str, x: int, y: int, orientation: str, rot: int, reversed: bool):
+    def __init__(self, word: str, x: int, y: int, orientation: str, rot: int, reversed: bool, path: list[tuple[int, int]] | None = None):
         self.word = word
         self.x = x
         self.y = y
         self.orientation = orientation
         self.rot = rot
         self.reversed = reversed
+        self.path = path
+
+    def cells(self) -> list[tuple[int, int]]:
+        if self.path is not None:
+            return self.path
+        dx, dy = direction_by_orientation[self.orientation]
+        return [(self.x + i * dx, self.y + i * dy) for i in range(len(self.word))]
+
+
+# step from one letter to the next, for the forward reading direction
+direction_by_orientation = {
+    "horizontal": (1, 0),
+    "vertical": (0, 1),
+    "diagonal": (1, 1),
+    "antidiagonal": (-1, 1),
+}
+
+grid_automaton = get_word_automaton(dictionary_popular)
+grid_shift_index = get_shift_signature_index(dictionary_popular)
+
 
+def find_rotated_grid_words(grid: str, rotate: bool, reverse: bool, diagonal: bool = False) -> list[GridResult]:
+    return __find_grid_words(grid, rotate, reverse, diagonal)
 
-def find_rotated_grid_words(grid: str, rotate: bool, reverse: bool) -> list[GridResult]:
+def grid_lines(rows: list[str], diagonal: bool) -> list[tuple[str, list[tuple[int, int]], str]]:
+    # every line of the grid as (text, cell of every letter, orientation)
+    width, height = len(rows[0]), len(rows)
+    lines = []
+
+    for y, row in enumerate(rows):
+        lines.append((row, [(x, y) for x in range(width)], "horizontal"))
+    for x in range(width):
+        lines.append(("".join([row[x] for row in rows]), [(x, y) for y in range(height)], "vertical"))
+
+    if diagonal:
+        for start in range(-(height - 1), width):
+            cells = [(start + y, y) for y in range(height) if 0 <= start + y < width]
+            lines.append(("".join([rows[y][x] for x, y in cells]), cells, "diagonal"))
+        for start in range(width + height - 1):
+            cells = [(start - y, y) for y in range(height) if 0 <= start - y < width]
+            lines.append(("".join([rows[y][x] for x, y in cells]), cells, "antidiagonal"))
+
+    return lines
+
+def __find_grid_words(grid: str, rotate: bool, reverse: bool, diagonal: bool = False) -> list[GridResult]:
+    rows = [row for row in grid.split() if row != ""]
+    if any([len(row) != len(rows[0]) for row in rows]):
+        return [GridResult("Not a grid", -1, -1, "", -1, False)]
+
+    res = []
+
+    for line, cells, orientation in grid_lines(rows, diagonal):
+        for match in search_string_for_submatches(line, reverse, rotate):
+            x, y = cells[match[1]]
+            res.append(GridResult(match[0], x, y, orientation, match[3], match[2]))
+
+    return sorted(res, key=lambda r: r.rot)  # stable, grouped by rotation like the separate searches used to be
+
+def rotate_string(s: str, rot: int) -> str:
+    return "".join([chr((ord(c) - 97 - rot) % 26 + 97) if "a" <= c <= "z" else c for c in s])
+
+def search_string_for_submatches(s: str, reverse: bool, rotate: bool = False, min_length: int = 4) -> list[tuple[str, int, bool, int]]:
+    # (word, start, reversed, rotation), all 26 rotations are searched in the same pass if rotate is set
     if rotate:
-        return [res for rot in range(0, 25) for res in __find_grid_words(rotate_grid(grid, rot), rot, reverse)]  # python is a terrible language
+        matches = [(rot, start, start + length, False) for start, length, rot in grid_shift_index.scan(s, min_length)]
+        if reverse:
+            # a word in the reversed string starting at i covers s[len(s) - i - length:len(s) - i]
+            matches += [(rot, len(s) - start - length, len(s) - start, True) for start, length, rot in grid_shift_index.scan(s[::-1], min_length)]
     else:
-        return __find_grid_words(grid, 0, reverse)
+        matches = [(0, start, start + length, False) for start, length in grid_automaton.scan(s, min_length)]
+        if reverse:
+            matches += [(0, len(s) - start - length, len(s) - start, True) for start, length in grid_automaton.scan(s[::-1], min_length)]
+
+    return [(rotate_string(s[start:end][::-1] if reversed else s[start:end], rot), start, reversed, rot) for rot, start, end, reversed in sorted(matches)]
+
 
-def rotate_grid(grid: str, rot: int) -> str:
-    return CaesarCipher().encode(grid.encode("utf-8"), str(rot))
+# Path search, words traced through adjacent cells (Boggle)
 
-def __find_grid_words(grid: str, rot_hint: int, reverse: bool) -> list[GridResult]:
+def find_grid_paths(grid: str, min_length: int = 4, allow_reuse: bool = False, timeout_stamp: float | None = None) -> list[GridResult]:
     rows = [row for row in grid.split() if row != ""]
     if any([len(row) != len(rows[0]) for row in rows]):
         return [GridResult("Not a grid", -1, -1, "", -1, False)]
 
-    cols = ["".join([row[col_i] for row in rows]) for col_i in range(len(rows[0]))]
-
-    res = []
+    width, height = len(rows[0]), len(rows)
+    neighbours = {
+        (x, y): [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0) and 0 <= x + dx < width and 0 <= y + dy < height]
+        for y in range(height) for x in range(width)
+    }
+    goto, is_word = grid_automaton.goto, grid_automaton.is_word
 
-    for i, row in enumerate(rows):
-        for match in search_string_for_submatches(row, reverse):
-            res.append(GridResult(match[0], match[1], i, "horizontal", rot_hint, match[2]))
-    for i, col in enumerate(cols):
-        for match in search_string_for_submatches(col, reverse):
-            res.append(GridResult(match[0], i, match[1], "vertical", rot_hint, match[2]))
+    found: dict[str, GridResult] = {}
+    steps = 0
 
-    return res
+    def extend(cell: tuple[int, int], node: int, path: list[tuple[int, int]], word: str):
+        nonlocal steps
+        steps += 1
+        if timeout_stamp is not None and steps % 1024 == 0 and time.time() > timeout_stamp:
+            raise TimeoutError()
 
-def search_string_for_submatches(s: str, reverse: bool) -> list[tuple[str, int, bool]]:
-    matches = []
+        if is_word[node] and len(word) >= min_length and word not in found:
+            found[word] = GridResult(word, path[0][0], path[0][1], "path", 0, False, list(path))
 
-    for start in range(len(s) - 1):
-        for end in range(start + 1 + 3, len(s)+1):  # min length: 3
-            if s[start:end] in dictionary_popular:
-                matches.append((s[start:end], start, False))
-            if reverse and s[start:end][::-1] in dictionary_popular:
-                matches.append((s[start:end][::-1], start, True))
+        # only continue along prefixes of dictionary words
+        for next_cell in neighbours[cell]:
+            if not allow_reuse and next_cell in path:
+                continue
+            next_node = goto[node].get(rows[next_cell[1]][next_cell[0]])
+            if next_node is not None:
+                path.append(next_cell)
+                extend(next_cell, next_node, path, word + rows[next_cell[1]][next_cell[0]])
+                path.pop()
 
-    return matches
+    try:
+        for (x, y) in neighbours:
+            node = goto[0].get(rows[y][x])
+            if node is not None:
+                extend((x, y), node, [(x, y)], rows[y][x])
+    except TimeoutError:
+        pass
 
+    return sorted(found.values(), key=lambda r: (-len(r.word), r.word))
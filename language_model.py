@@ -0,0 +1,83 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+# letters a-z are symbols 0-25, everything else (word gaps, digits, punctuation) is the gap symbol 26
+NGRAM_SYMBOLS = 27
+GAP = 26
+
+# symbol of every byte, input is encoded as ascii with "?" for anything else first, so symbols line up with characters
+symbol_by_byte = np.full(256, GAP, dtype=np.int64)
+symbol_by_byte[ord("a"):ord("z") + 1] = np.arange(26)
+
+
+def to_symbols(text: str) -> np.ndarray:
+    return symbol_by_byte[np.frombuffer(text.encode("ascii", "replace").lower(), dtype=np.uint8)]
+
+
+class NGramModel:
+    # Quadgram and bigram log10 probabilities over letters and word gaps, estimated from a word list in which
+    # earlier words are more common. Scores are the mean log probability per n-gram, so they do not depend on
+    # the length of a string: English text scores around -4.5, shifted letters and symbol soup around -7.
+    quadgrams: np.ndarray  # float32, NGRAM_SYMBOLS ** 4
+    bigrams: np.ndarray  # float32, NGRAM_SYMBOLS ** 2
+
+    def __init__(self, dictionary: Sequence[str]) -> None:
+        print(f"Building n-gram model for {len(dictionary)} words...")
+        self.build_tables(dictionary)
+        print(f"N-gram model built, {np.count_nonzero(self.quadgrams > self.quadgrams.min())} quadgrams")
+
+    def build_tables(self, dictionary: Sequence[str]):
+        words = [w for w in dictionary if len(w) > 0]
+
+        # the word list is read as one text, so n-grams across word gaps are counted too. Zipf weights stand in
+        # for the missing word frequencies, every n-gram counts with the weight of the word it starts in.
+        text = " " + " ".join(words) + " "
+        symbols = to_symbols(text)
+        weights = np.repeat(1.0 / (np.arange(len(words)) + 50.0), [len(w) + 1 for w in words])
+        weights = np.concatenate([weights[:1], weights])
+
+        self.quadgrams = self.log_probabilities(self.ngram_codes(symbols, 4), weights[:len(symbols) - 3], 4)
+        self.bigrams = self.log_probabilities(self.ngram_codes(symbols, 2), weights[:len(symbols) - 1], 2)
+
+    @staticmethod
+    def ngram_codes(symbols: np.ndarray, n: int) -> np.ndarray:
+        codes = np.zeros(len(symbols) - n + 1, dtype=np.int64)
+        for i in range(n):
+            codes = codes * NGRAM_SYMBOLS + symbols[i:len(symbols) - n + 1 + i]
+        return codes
+
+    @staticmethod
+    def log_probabilities(codes: np.ndarray, weights: np.ndarray, n: int) -> np.ndarray:
+        counts = np.bincount(codes, weights=weights, minlength=NGRAM_SYMBOLS ** n)
+        total = counts.sum()
+        floor = np.log10(counts[counts > 0].min() / 10 / total)  # unseen n-grams are ten times rarer than the rarest seen one
+        return np.where(counts > 0, np.log10(np.maximum(counts, 1e-300) / total), floor).astype(np.float32)
+
+    def score_batch(self, strings: Sequence[str]) -> np.ndarray:
+        # all strings are scored at once as one gap separated text, the sums per string are differences of a
+        # running sum over all n-grams of that text
+        if len(strings) == 0:
+            return np.zeros(0, dtype=np.float64)
+
+        lengths = np.array([len(s) + 1 for s in strings], dtype=np.int64)
+        starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])  # position of the gap before every string
+        symbols = to_symbols(" " + " ".join(strings) + "   ")  # extra gaps so even a single empty string has a quadgram
+
+        quadgram_sums = np.concatenate([[0.0], np.cumsum(self.quadgrams[self.ngram_codes(symbols, 4)], dtype=np.float64)])
+        bigram_sums = np.concatenate([[0.0], np.cumsum(self.bigrams[self.ngram_codes(symbols, 2)], dtype=np.float64)])
+
+        # a string of length l with its two gaps has l - 1 quadgrams starting at its leading gap
+        quadgram_count = lengths - 2
+        bigram_count = lengths
+        quadgram_scores = (quadgram_sums[starts + np.maximum(quadgram_count, 0)] - quadgram_sums[starts]) / np.maximum(quadgram_count, 1)
+        bigram_scores = (bigram_sums[starts + bigram_count] - bigram_sums[starts]) / bigram_count
+
+        return np.where(quadgram_count > 0, quadgram_scores, bigram_scores)
+
+    def score(self, string: str) -> float:
+        return float(self.score_batch([string])[0])
+
+    def rank(self, strings: Sequence[str]) -> list[int]:
+        # indices of strings, most English looking first
+        return [int(i) for i in np.argsort(-self.score_batch(strings), kind="stable")]
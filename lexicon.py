@@ -0,0 +1,263 @@
+import gc
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections.abc import Callable, Iterator, Sequence
+from typing import Any, TypeVar, overload
+
+# Compiled word list layout (native byte order):
+#   header   magic, format version, word count, blob length, sha256 of the source file
+#   offsets  (count + 1) x uint32, start of every word in the blob
+#   order    count x uint32, word ids sorted alphabetically (for membership tests)
+#   blob     utf-8 encoded words without separators, in source file order
+LEXICON_MAGIC = b"PHLEX\0\0\0"
+LEXICON_FORMAT_VERSION = 1
+LEXICON_HEADER = struct.Struct("<8sIIQ32s")
+LEXICON_HEADER_SIZE = 64  # padded, keeps the uint32 arrays aligned
+
+# bump whenever the layout of a cached index class changes
+INDEX_CACHE_VERSION = 3
+INDEX_CACHE_DIR = ".index_cache"
+
+# (what, how, seconds) for everything built or loaded at startup
+startup_timings: list[tuple[str, str, float]] = []
+
+
+def format_startup_report() -> str:
+    lines = ["Startup timings:"]
+    lines += [f"  {what:<40} {how:<8} {seconds * 1000:9.1f} ms" for what, how, seconds in startup_timings]
+    for how in ["built", "loaded", "compiled", "mapped"]:
+        total = sum([seconds for _, h, seconds in startup_timings if h == how])
+        if total > 0:
+            lines.append(f"  total {how:<34} {'':<8} {total * 1000:9.1f} ms")
+    return "\n".join(lines)
+
+
+def hash_file(filename: str) -> str:
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Lexicon(Sequence[str]):
+    name: str
+    content_hash: str
+
+    def __init__(self, name: str, compiled_filename: str) -> None:
+        self.name = name
+
+        with open(compiled_filename, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, blob_length, digest = LEXICON_HEADER.unpack_from(self._mm, 0)
+        if magic != LEXICON_MAGIC or version != LEXICON_FORMAT_VERSION:
+            raise ValueError(f"{compiled_filename} is not a compiled lexicon of version {LEXICON_FORMAT_VERSION}")
+
+        self.content_hash = digest.hex()
+        self._count = count
+
+        view = memoryview(self._mm)
+        offsets_start = LEXICON_HEADER_SIZE
+        order_start = offsets_start + 4 * (count + 1)
+        self._blob_start = order_start + 4 * count
+        self._offsets = view[offsets_start:order_start].cast("I")
+        self._order = view[order_start:self._blob_start].cast("I")
+        self._words: tuple[str, ...] | None = None
+
+    @staticmethod
+    def compile(source_filename: str, compiled_filename: str, content_hash: str) -> None:
+        with open(source_filename) as f:
+            words = [l.replace("\n", "") for l in f.readlines()]
+
+        encoded = [w.encode("utf-8") for w in words]
+        offsets = [0]
+        for e in encoded:
+            offsets.append(offsets[-1] + len(e))
+        order = sorted(range(len(words)), key=lambda i: words[i])
+
+        header = LEXICON_HEADER.pack(LEXICON_MAGIC, LEXICON_FORMAT_VERSION, len(words), offsets[-1], bytes.fromhex(content_hash))
+
+        # write to a temporary file first, several workers may start at the same time
+        tmp_filename = f"{compiled_filename}.{os.getpid()}.tmp"
+        with open(tmp_filename, "wb") as f:
+            f.write(header.ljust(LEXICON_HEADER_SIZE, b"\0"))
+            f.write(array("I", offsets).tobytes())
+            f.write(array("I", order).tobytes())
+            f.write(b"".join(encoded))
+        os.replace(tmp_filename, compiled_filename)
+
+    @classmethod
+    def load(cls, source_filename: str) -> "Lexicon":
+        start = time.perf_counter()
+        compiled_filename = os.path.splitext(source_filename)[0] + ".lex"
+        content_hash = hash_file(source_filename)
+
+        if os.path.exists(compiled_filename):
+            try:
+                lexicon = cls(source_filename, compiled_filename)
+                if lexicon.content_hash == content_hash:
+                    startup_timings.append((source_filename, "mapped", time.perf_counter() - start))
+                    return lexicon
+                lexicon.close()
+            except ValueError:
+                pass
+
+        print(f"Compiling word list {source_filename}...")
+        cls.compile(source_filename, compiled_filename, content_hash)
+        lexicon = cls(source_filename, compiled_filename)
+        print(f"Word list compiled, {len(lexicon)} words")
+        startup_timings.append((source_filename, "compiled", time.perf_counter() - start))
+        return lexicon
+
+    def close(self) -> None:
+        self._words = None
+        self._offsets.release()
+        self._order.release()
+        self._mm.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @overload
+    def __getitem__(self, index: int) -> str: ...
+    @overload
+    def __getitem__(self, index: slice) -> list[str]: ...
+
+    def __getitem__(self, index: int | slice) -> str | list[str]:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("lexicon index out of range")
+        start = self._blob_start + self._offsets[index]
+        end = self._blob_start + self._offsets[index + 1]
+        return self._mm[start:end].decode("utf-8")
+
+    def __iter__(self) -> Iterator[str]:
+        mm, offsets, base = self._mm, self._offsets, self._blob_start
+        for i in range(self._count):
+            yield mm[base + offsets[i]:base + offsets[i + 1]].decode("utf-8")
+
+    def words(self) -> tuple[str, ...]:
+        # all words decoded in one go and kept, for full scans, which would otherwise decode every word on every scan
+        if self._words is None:
+            blob = self._mm[self._blob_start:self._blob_start + self._offsets[self._count]]
+            bounds = self._offsets.tolist()
+            if blob.isascii():  # byte offsets are character offsets
+                text = blob.decode("ascii")
+                self._words = tuple([text[start:end] for start, end in zip(bounds, bounds[1:])])
+            else:
+                self._words = tuple([blob[start:end].decode("utf-8") for start, end in zip(bounds, bounds[1:])])
+        return self._words
+
+    def __contains__(self, word: object) -> bool:
+        return isinstance(word, str) and self.find(word) != -1
+
+    def find(self, word: str) -> int:
+        position = bisect_left(self._order, word, key=self.__getitem__)
+        if position < self._count and self[self._order[position]] == word:
+            return self._order[position]
+        return -1
+
+    def __repr__(self) -> str:
+        return f"Lexicon({self.name!r}, {self._count} words)"
+
+
+T = TypeVar("T")
+
+class IndexRegistry:
+    indices: dict[tuple[str, str], Any]
+    cache_dir: str | None
+
+    def __init__(self, cache_dir: str | None = INDEX_CACHE_DIR) -> None:
+        self.indices = {}
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+
+    def get(self, kind: str, lexicon: Lexicon, builder: Callable[[Lexicon], T]) -> T:
+        key = (kind, lexicon.name)
+        if key in self.indices:
+            return self.indices[key]
+
+        with self._lock:
+            if key not in self.indices:
+                self.indices[key] = self._load_or_build(kind, lexicon, builder)
+            return self.indices[key]
+
+    def _cache_prefix(self, kind: str, lexicon: Lexicon) -> str:
+        return f"{kind}-{os.path.splitext(os.path.basename(lexicon.name))[0]}-"
+
+    def _cache_filename(self, kind: str, lexicon: Lexicon) -> str:
+        assert self.cache_dir is not None
+        return os.path.join(self.cache_dir, f"{self._cache_prefix(kind, lexicon)}{lexicon.content_hash[:16]}-v{INDEX_CACHE_VERSION}.pickle")
+
+    def _load_or_build(self, kind: str, lexicon: Lexicon, builder: Callable[[Lexicon], T]) -> T:
+        what = f"{kind} index for {lexicon.name}"
+        start = time.perf_counter()
+
+        index = self._load_cached(kind, lexicon)
+        if index is not None:
+            startup_timings.append((what, "loaded", time.perf_counter() - start))
+            return index
+
+        index = builder(lexicon)
+        startup_timings.append((what, "built", time.perf_counter() - start))
+        self._store_cached(kind, lexicon, index)
+        return index
+
+    def _load_cached(self, kind: str, lexicon: Lexicon) -> Any | None:
+        if self.cache_dir is None:
+            return None
+        filename = self._cache_filename(kind, lexicon)
+        if not os.path.exists(filename):
+            return None
+
+        # the cyclic gc would otherwise rescan the growing object graph many times while unpickling
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with open(filename, "rb") as f:
+                version, content_hash, index = pickle.load(f)
+        except Exception as e:  # corrupt or written by an incompatible class layout
+            print(f"Ignoring index cache {filename}: {e}")
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        if version != INDEX_CACHE_VERSION or content_hash != lexicon.content_hash:
+            return None
+        return index
+
+    def _store_cached(self, kind: str, lexicon: Lexicon, index: Any) -> None:
+        if self.cache_dir is None:
+            return
+        filename = self._cache_filename(kind, lexicon)
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+            # drop caches of previous word list versions
+            prefix = self._cache_prefix(kind, lexicon)
+            for old in os.listdir(self.cache_dir):
+                if old.startswith(prefix) and old.endswith(".pickle"):
+                    os.remove(os.path.join(self.cache_dir, old))
+
+            tmp_filename = f"{filename}.{os.getpid()}.tmp"
+            with open(tmp_filename, "wb") as f:
+                pickle.dump((INDEX_CACHE_VERSION, lexicon.content_hash, index), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_filename, filename)
+        except OSError as e:
+            print(f"Could not write index cache {filename}: {e}")
+
+
+# one instance of every index per process, shared by all tabs
+lexicon_registry = IndexRegistry()
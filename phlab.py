@@ -1,15 +1,20 @@
 import gradio as gr
 from setuptools.command.rotate import rotate
 
-from ciphers import all_ciphers
-from dictionary import AnagramLookupTable, dictionary_all, dictionary_popular, find_words_by_regex, T9LookupTree
-from analysis import bruteforce_string_filter_sort, analyze_frequencies, calculate_entropy, is_isbn
+from ciphers import BULK_CHUNK_SIZE, all_ciphers
+from pipeline import CipherPipeline
+from dictionary import get_anagram_lookup_table, get_pattern_index, get_regex_search_index, dictionary_all, dictionary_popular, find_words
+from analysis import SearchProgress, SearchStats, bruteforce_string_iter, sort_bruteforce_results, start_bruteforce_pool, is_isbn
 from evaluation import eval_expression
 from oeis import oeis_database
-from grid_search import find_rotated_grid_words
-import re
+from grid_search import find_grid_paths, find_rotated_grid_words
+from anagram_search import find_multiword_anagrams, key_ranks
+import os
+import tempfile
 import time
 from config import config
+from lexicon import format_startup_report
+from cryptanalysis import TextStatistics, analyze_chunks, analyze_text, describe_statistics, file_chunks, is_substitution_key, is_vigenere_key, text_chunks
 
 #redirect_to_light_js = "window.addEventListener('load', function () {gradioURL = window.location.href; if (!gradioURL.endsWith('?__theme=light')) {window.location.replace(gradioURL + '?__theme=dark');}});"
 
@@ -17,9 +22,9 @@ from config import config
 
 def run_cipher(input_cipher_index: int, input_key: str, output_cipher_index: int, output_key: str, input_text: str) -> str:
     if len(input_text) > 3000:
-        return "Input too long"
+        return "Input too long, use the bulk conversion"
     if len(input_text) > 300 and input_key == "all":
-        return "Input too long"
+        return "Input too long, use the bulk conversion"
 
     input_cipher = all_ciphers[input_cipher_index]
     output_cipher = all_ciphers[output_cipher_index]
@@ -33,55 +38,146 @@ def run_cipher(input_cipher_index: int, input_key: str, output_cipher_index: int
 
     return output_text
 
+# converted files live in a directory that is removed on exit, gradio serves a copy of them, so older ones are
+# deleted with every conversion
+bulk_output_dir = tempfile.TemporaryDirectory(prefix="phlab-bulk-")
+BULK_OUTPUT_MAX_AGE = 600.0
+
+def remove_old_bulk_outputs() -> None:
+    for entry in os.scandir(bulk_output_dir.name):
+        try:
+            if time.time() - entry.stat().st_mtime > BULK_OUTPUT_MAX_AGE:
+                os.remove(entry.path)
+        except FileNotFoundError:  # removed by a conversion running at the same time
+            pass
+
+def run_cipher_bulk(input_cipher_index: int, input_key: str, output_cipher_index: int, output_key: str, input_text: str, filename: str | None) -> tuple[str | None, str]:
+    # streams the file, or the text if there is no file, through both ciphers into a file for download
+    remove_old_bulk_outputs()
+    chunks = file_chunks(filename, BULK_CHUNK_SIZE) if filename is not None else text_chunks(input_text, BULK_CHUNK_SIZE)
+    input_cipher = all_ciphers[input_cipher_index]
+    output_cipher = all_ciphers[output_cipher_index]
+
+    characters = 0
+    try:
+        with tempfile.NamedTemporaryFile("w", encoding="utf-8", prefix=f"{output_cipher.name.lower()}-", suffix=".txt", dir=bulk_output_dir.name, delete=False) as f:
+            for piece in output_cipher.encode_chunks(input_cipher.decode_chunks(chunks, input_key), output_key):
+                f.write(piece)
+                characters += len(piece)
+    except ValueError as e:
+        os.remove(f.name)
+        return None, str(e)
+
+    return f.name, f"Converted to {characters} characters"
+
+def run_pipeline(spec: str, input_text: str) -> str:
+    if len(input_text) > 3000:
+        return "Input too long"
+    try:
+        pipeline = CipherPipeline.parse(spec)
+    except ValueError as e:
+        return str(e)
+    return "\n".join(pipeline.run(input_text))
+
 
 #available_ciphers = ["Text", "Numbers", "Cesar", "Tap", "Morse"]
 cipher_names = [c.name for c in all_ciphers]
 
 # Analysis
 
-def brute_force_input(input: str) -> str:
+bruteforce_workers = int(config.get("bruteforce_workers", os.cpu_count() or 1))
+if bruteforce_workers > 1:
+    start_bruteforce_pool(bruteforce_workers)
+
+def brute_force_input(input: str, collect_stats: bool, pipeline_spec: str):
     timeout_stamp = time.time() + 30.0
-    results = bruteforce_string_filter_sort(input, timeout_stamp=timeout_stamp, total_iterations=3)
-    result_string = "\n".join([str(r) for r in results]) if len(results) != 0 else "No results found"
+    try:
+        extra_transforms = [CipherPipeline.parse(pipeline_spec)] if pipeline_spec.strip() != "" else []
+    except ValueError as e:
+        yield "", str(e), ""
+        return
+    progress = SearchProgress()
+    stats = SearchStats() if collect_stats else None
+    results = []
+    last_update = time.time()
+
+    for new_results in bruteforce_string_iter(input, timeout_stamp=timeout_stamp, total_iterations=3, parallel=bruteforce_workers > 1, progress=progress, stats=stats, extra_transforms=extra_transforms):
+        results += new_results
+        if time.time() - last_update > 0.25:
+            last_update = time.time()
+            yield "\n".join([str(r) for r in sort_bruteforce_results(results)]), f"Searching... {progress}", str(stats) if stats is not None else ""
+
+    result_string = "\n".join([str(r) for r in sort_bruteforce_results(results)]) if len(results) != 0 else "No results found"
     
     if time.time() > timeout_stamp:
         result_string = "Maximum computation time exceeded!\n\n" + result_string
 
-    return result_string
+    yield result_string, f"Done, {progress}", str(stats) if stats is not None else ""
 
 
-def statistical_text_analysis(input: str) -> tuple[dict[str, float], str]:
-    if input == "":
-        return {}, ""
+def format_text_statistics(stats: TextStatistics) -> tuple[dict[str, float], str, str]:
+    freqs_by_symbol = stats.symbol_frequencies()
 
-    freqs_by_symbol = analyze_frequencies(input)
-    
     if len(freqs_by_symbol) == 0:
-        return {}, ""
+        return {}, "", ""
 
     num_symbols = sum(freqs_by_symbol.values())
-    max_freq = max(freqs_by_symbol.values())
-
     norm_freqs = {s: freqs_by_symbol[s] / num_symbols for s in freqs_by_symbol}
-    top_norm_freqs = {s: freqs_by_symbol[s] / max_freq for s in freqs_by_symbol}
 
-    entropy = calculate_entropy(probs=list(norm_freqs.values()))
+    return norm_freqs, f"{stats.entropy():.3}", describe_statistics(stats)
 
-    return norm_freqs, f"{entropy:.3}"
+def statistical_text_analysis(input: str) -> tuple[dict[str, float], str, str]:
+    if input == "":
+        return {}, "", ""
+    return format_text_statistics(analyze_text(input))
+
+def statistical_file_analysis(filename: str | None) -> tuple[dict[str, float], str, str]:
+    if filename is None:
+        return {}, "", ""
+    return format_text_statistics(analyze_chunks(file_chunks(filename)))
 
 
 # Dictionary
 
-anagram_lookup_table_all = AnagramLookupTable(dictionary_all)
-anagram_lookup_table_common = AnagramLookupTable(dictionary_popular)
+anagram_lookup_table_all = get_anagram_lookup_table(dictionary_all)
+anagram_lookup_table_common = get_anagram_lookup_table(dictionary_popular)
+# ranked here once, not within the deadline of the first multiword search
+key_ranks(anagram_lookup_table_all)
+key_ranks(anagram_lookup_table_common)
 
-def lookup_anagram(anagram: str, limit_to_common: bool) -> str:
+def lookup_anagram(anagram: str, limit_to_common: bool, include_partial: bool) -> str:
     lookup_table = anagram_lookup_table_all if not limit_to_common else anagram_lookup_table_common
-    solutions = lookup_table.lookup(anagram.replace(" ", ""))
+    if include_partial:
+        solutions = lookup_table.lookup_partial(anagram.replace(" ", ""))
+    else:
+        solutions = lookup_table.lookup(anagram.replace(" ", ""))
     return f"{len(solutions)} results found:\n\n{'\n'.join(solutions)}" if solutions is not None else f"No results found for '{anagram}'"
 
-def find_word(search_string: str, limit_to_common: bool) -> str:
-    results = find_words_by_regex(re.compile(search_string, re.IGNORECASE), dictionary_all if not limit_to_common else dictionary_popular)
+def lookup_multiword_anagram(anagram: str, limit_to_common: bool, max_words: int, min_word_length: int):
+    lookup_table = anagram_lookup_table_all if not limit_to_common else anagram_lookup_table_common
+    timeout_stamp = time.time() + 10.0
+
+    solutions = []
+    last_update = time.time()
+    for phrase in find_multiword_anagrams(anagram, lookup_table, timeout_stamp, max_words=int(max_words), min_word_length=int(min_word_length)):
+        solutions.append(phrase)
+        if time.time() - last_update > 0.25:
+            last_update = time.time()
+            yield f"{len(solutions)} results found so far...\n\n{'\n'.join(solutions)}"
+        if len(solutions) >= 5000:
+            break
+
+    result_string = f"{len(solutions)} results found:\n\n{'\n'.join(solutions)}" if len(solutions) != 0 else f"No results found for '{anagram}'"
+    if time.time() > timeout_stamp:
+        result_string = "Maximum computation time exceeded!\n\n" + result_string
+    yield result_string
+
+for dictionary in [dictionary_all, dictionary_popular]:
+    get_pattern_index(dictionary)
+    get_regex_search_index(dictionary)
+
+def find_word(search_string: str, limit_to_common: bool, must_contain: str, must_not_contain: str) -> str:
+    results = find_words(search_string, dictionary_all if not limit_to_common else dictionary_popular, must_contain, must_not_contain)
     return f"{len(results)} words found:\n\n{'\n'.join(results)}" if len(results) != 0 else f"No results found for '{search_string}'"
 
 # T9
@@ -118,18 +214,21 @@ def index_words(words: str, indices: str, include_spaces: bool) -> str:
 
 # Word grid
 
-def solve_word_grid(input_grid: str, all_rots: bool, reverse: bool) -> tuple[str, str]:
+def solve_word_grid(input_grid: str, all_rots: bool, reverse: bool, diagonal: bool, path_search: bool, allow_reuse: bool, min_length: int) -> tuple[str, str]:
     input_grid = input_grid.strip()
     input_grid = input_grid.replace(" ", "").lower()
 
     if len(input_grid) == 0:
         return "", ""
 
-    results = find_rotated_grid_words(input_grid, rotate=all_rots, reverse=reverse)
+    if path_search:
+        results = find_grid_paths(input_grid, min_length=int(min_length), allow_reuse=allow_reuse, timeout_stamp=time.time() + 5.0)
+    else:
+        results = find_rotated_grid_words(input_grid, rotate=all_rots, reverse=reverse, diagonal=diagonal)
 
     output_grid = input_grid
     if len(results) != 0 and results[0].x != -1: # catch invalid
-        matched_locations = [(x, res.y) for res in results for x in range(res.x, res.x + len(res.word)) if res.orientation == "horizontal"] + [(res.x, y) for res in results for y in range(res.y, res.y + len(res.word)) if res.orientation == "vertical"]
+        matched_locations = set([cell for res in results for cell in res.cells()])
     else:
         matched_locations = []
 
@@ -204,12 +303,30 @@ with gr.Blocks(css=css, theme=gr.themes.Default()) as app:
                 
                 cipher_text_area_right = gr.TextArea(interactive=False, show_label=False, show_copy_button=True)
                 cipher_key_area_right = gr.Textbox(label="Key", interactive=True)
+        with gr.Accordion("Pipeline", open=False):
+            gr.Markdown("Runs the input text through a chain of steps, e.g. `Morse decode -> Numbers encode -> Caesar encode 3`.")
+            with gr.Row():
+                cipher_pipeline_spec = gr.Textbox(label="Steps", placeholder="Morse decode -> Numbers encode -> Caesar encode 3", interactive=True)
+                cipher_pipeline_button = gr.Button("Run", variant="primary", scale=0)
+            cipher_pipeline_output = gr.TextArea(interactive=False, show_label=False, show_copy_button=True)
+        with gr.Accordion("Bulk conversion", open=False):
+            gr.Markdown("Converts a file, or the input text without a file, of any length. Keys that solve or list every shift use the best key for the start of the text.")
+            with gr.Row():
+                cipher_bulk_input = gr.File(label="Input file", type="filepath", file_types=["text"])
+                cipher_bulk_output = gr.File(label="Converted file", interactive=False)
+            with gr.Row():
+                cipher_bulk_button = gr.Button("Convert", variant="primary", scale=0)
+                cipher_bulk_status = gr.Markdown("")
         
         def get_key(cindex, key):
             if cindex == cipher_names.index("Caesar") and not key.isnumeric():
                 return "all"
             if cindex == cipher_names.index("T9") and not key == "common" and not key == "all" and not key == "uncommon":
                 return "common"
+            if cindex == cipher_names.index("Substitution") and not is_substitution_key(key):
+                return "auto"
+            if cindex == cipher_names.index("Vigenère") and not is_vigenere_key(key):
+                return "auto"
             return key
 
         cipher_selector_left.select(
@@ -228,7 +345,19 @@ with gr.Blocks(css=css, theme=gr.themes.Default()) as app:
             triggers=[cipher_run_button_left.click, cipher_text_area_left.change, cipher_key_area_left.input, cipher_selector_left.select, cipher_selector_right.select, cipher_key_area_right.input],
             fn=run_cipher,
             inputs=[cipher_selector_left, cipher_key_area_left, cipher_selector_right, cipher_key_area_right, cipher_text_area_left],
-            outputs=[cipher_text_area_right]
+            outputs=[cipher_text_area_right],
+            trigger_mode="always_last"  # solving a substitution takes a moment, skip the keystrokes typed meanwhile
+        )
+        gr.on(
+            triggers=[cipher_pipeline_button.click, cipher_pipeline_spec.submit],
+            fn=run_pipeline,
+            inputs=[cipher_pipeline_spec, cipher_text_area_left],
+            outputs=[cipher_pipeline_output]
+        )
+        cipher_bulk_button.click(
+            fn=run_cipher_bulk,
+            inputs=[cipher_selector_left, cipher_key_area_left, cipher_selector_right, cipher_key_area_right, cipher_text_area_left, cipher_bulk_input],
+            outputs=[cipher_bulk_output, cipher_bulk_status]
         )
         # gr.on(
         #     triggers=[base_run_button_right.click, right_text_area.input, right_key_area.input],
@@ -249,39 +378,67 @@ with gr.Blocks(css=css, theme=gr.themes.Default()) as app:
         with gr.Row():
             with gr.Column():
                 analysis_input = gr.Textbox(interactive=True, label="Input", placeholder="Input a single word")
-                analysis_solve_button = gr.Button("Do Magic", variant="primary")
+                with gr.Row():
+                    analysis_solve_button = gr.Button("Do Magic", variant="primary")
+                    analysis_cancel_button = gr.Button("Cancel", variant="stop", scale=0)
+                analysis_status = gr.Markdown("")
+                with gr.Accordion("Search statistics", open=False):
+                    analysis_collect_stats = gr.Checkbox(label="Collect statistics (searches in a single process)", value=False)
+                    analysis_stats = gr.Code(value="", language=None, interactive=False, show_label=False)
+                with gr.Accordion("Pipeline transform", open=False):
+                    analysis_pipeline = gr.Textbox(label="Also try this pipeline at every step (searches in a single process)", placeholder="Morse decode -> Caesar decode 3", interactive=True)
 
                 entropy_label = gr.Label(container=True, label="Entropy - language = 3.6 - 4.2", elem_classes=["top-margin"])                
                 frequency_bins = gr.Label(value={}, label="Frequency Analysis", num_top_classes=10, container=False, elem_classes=["label-no-heading"])
+                text_statistics = gr.Markdown("")
+                analysis_file = gr.File(label="Analyze a text file", type="filepath", file_types=["text"])
                 #gr.Markdown("Entropy of natural language: 3.5 - 4.2")
 
 
             with gr.Column():
                 analysis_output = gr.TextArea(label="Output", interactive=False)
 
-        gr.on(
+        analysis_event = gr.on(
             triggers=[analysis_input.submit, analysis_solve_button.click],
             fn=brute_force_input,
-            inputs=[analysis_input],
-            outputs=[analysis_output]
+            inputs=[analysis_input, analysis_collect_stats, analysis_pipeline],
+            outputs=[analysis_output, analysis_status, analysis_stats]
         )
+        analysis_cancel_button.click(fn=None, cancels=[analysis_event])
         analysis_input.change(
             fn=statistical_text_analysis,
             inputs=[analysis_input],
-            outputs=[frequency_bins, entropy_label]
+            outputs=[frequency_bins, entropy_label, text_statistics],
+            trigger_mode="always_last"
+        )
+        analysis_file.change(
+            fn=statistical_file_analysis,
+            inputs=[analysis_file],
+            outputs=[frequency_bins, entropy_label, text_statistics]
         )
 
     with gr.Tab("Anagram"):
         with gr.Row():
             anagram_input = gr.Textbox(interactive=True, label="Anagram", placeholder="tbr?tu")
             anagram_limit_common = gr.Checkbox(label="Limit to common words", value=False, interactive=True, scale=0, elem_classes=["centered-checkbox"])
-        anagram_solve_button = gr.Button("Lookup", variant="primary")
+            anagram_include_partial = gr.Checkbox(label="Include sub-anagrams", value=False, interactive=True, scale=0, elem_classes=["centered-checkbox"])
+        with gr.Row():
+            anagram_solve_button = gr.Button("Lookup", variant="primary")
+            anagram_phrase_button = gr.Button("Find phrases", variant="secondary")
+        with gr.Row():
+            anagram_max_words = gr.Slider(minimum=1, maximum=5, value=3, step=1, label="Maximum words per phrase", interactive=True)
+            anagram_min_word_length = gr.Slider(minimum=1, maximum=8, value=3, step=1, label="Minimum word length", interactive=True)
         anagram_output = gr.TextArea(label="Solutions", interactive=False)
 
         gr.on(
             triggers=[anagram_input.submit, anagram_solve_button.click],
             fn=lookup_anagram,
-            inputs=[anagram_input, anagram_limit_common],
+            inputs=[anagram_input, anagram_limit_common, anagram_include_partial],
+            outputs=[anagram_output]
+        )
+        anagram_phrase_button.click(
+            fn=lookup_multiword_anagram,
+            inputs=[anagram_input, anagram_limit_common, anagram_max_words, anagram_min_word_length],
             outputs=[anagram_output]
         )
 
@@ -289,13 +446,16 @@ with gr.Blocks(css=css, theme=gr.themes.Default()) as app:
         with gr.Row():
             dictionary_input = gr.Textbox(interactive=True, label="Regular Expression", placeholder="wa.+(er|it)")  # alternative: w.ter.rop
             dictionary_limit_common = gr.Checkbox(label="Limit to common words", value=False, interactive=True, scale=0, elem_classes=["centered-checkbox"])
+        with gr.Row():
+            dictionary_must_contain = gr.Textbox(interactive=True, label="Must contain", placeholder="aei")
+            dictionary_must_not_contain = gr.Textbox(interactive=True, label="Must not contain", placeholder="xyz")
         dictionary_solve_button = gr.Button("Search", variant="primary")
         dictionary_output = gr.TextArea(label="Results", interactive=False)
 
         gr.on(
-            triggers=[dictionary_input.submit, dictionary_solve_button.click],
+            triggers=[dictionary_input.submit, dictionary_solve_button.click, dictionary_must_contain.submit, dictionary_must_not_contain.submit],
             fn=find_word,
-            inputs=[dictionary_input, dictionary_limit_common],
+            inputs=[dictionary_input, dictionary_limit_common, dictionary_must_contain, dictionary_must_not_contain],
             outputs=[dictionary_output]
         )
     
@@ -340,11 +500,16 @@ with gr.Blocks(css=css, theme=gr.themes.Default()) as app:
 
             grid_search_all_rots = gr.Checkbox(label="Search all rotations")
             grid_include_reverse = gr.Checkbox(label="Include reverse")
+            grid_include_diagonal = gr.Checkbox(label="Include diagonals")
+            with gr.Row():
+                grid_path_search = gr.Checkbox(label="Path search (Boggle)")
+                grid_allow_reuse = gr.Checkbox(label="Allow reusing cells")
+                grid_min_length = gr.Slider(minimum=2, maximum=10, value=4, step=1, label="Minimum word length", interactive=True)
 
             gr.on(
-                triggers=[grid_input.change, grid_search_all_rots.change, grid_include_reverse.change],
+                triggers=[grid_input.change, grid_search_all_rots.change, grid_include_reverse.change, grid_include_diagonal.change, grid_path_search.change, grid_allow_reuse.change, grid_min_length.change],
                 fn=solve_word_grid,
-                inputs=[grid_input, grid_search_all_rots, grid_include_reverse],
+                inputs=[grid_input, grid_search_all_rots, grid_include_reverse, grid_include_diagonal, grid_path_search, grid_allow_reuse, grid_min_length],
                 outputs=[grid_output, grid_result_output]
             )
 
@@ -465,6 +630,7 @@ with gr.Blocks(css=css, theme=gr.themes.Default()) as app:
 
 demo = app
 
+print(format_startup_report())
 print("Launching webapp")
 app.launch()
 
@@ -0,0 +1,168 @@
+import re
+import unicodedata
+from collections.abc import Callable, Sequence
+
+from ciphers import Cipher, all_ciphers
+
+# A pipeline runs text through a chain of cipher steps. Runs of steps that map every character on its own, possibly
+# behind a decoder that maps every symbol on its own, are fused: a translate table maps each input character (or
+# symbol) straight to its output after the whole run, so the run is a single pass without intermediate strings.
+
+
+class PipelineStep:
+    cipher: Cipher
+    key: str | None
+    decoding: bool
+
+    def __init__(self, cipher: Cipher, key: str | None, decoding: bool) -> None:
+        self.cipher = cipher
+        self.key = key
+        self.decoding = decoding
+
+    def run(self, text: str) -> list[str]:
+        if self.decoding:
+            decoded = self.cipher.decode(text, self.key)
+            return [d.decode("utf-8") for d in decoded] if isinstance(decoded, list) else [decoded.decode("utf-8")]
+        encoded = self.cipher.encode(text.encode("utf-8"), self.key)
+        return encoded if isinstance(encoded, list) else [encoded]
+
+    def __str__(self) -> str:
+        return f"{self.cipher.name} {'decode' if self.decoding else 'encode'}" + (f" {self.key}" if self.key is not None else "")
+
+
+class FusedTable(dict):
+    # translate table that converts a character, or a symbol, on first use
+    def __init__(self, convert: Callable[[str], str], by_code: bool) -> None:
+        super().__init__()
+        self.convert = convert
+        self.by_code = by_code
+
+    def __missing__(self, key: int | str) -> str:
+        value = self.convert(chr(key) if isinstance(key, int) and self.by_code else key)
+        self[key] = value
+        return value
+
+
+class FusedRun:
+    # An optional symbol decoder followed by character mappings. Every mapping joins its outputs with a joiner and
+    # drops the last one, so the fused output ends with a known suffix of joiners, which is dropped once.
+    decoder: PipelineStep | None
+    steps: list[PipelineStep]
+    mappings: list[tuple[Callable[[str], str | None], str]]
+    suffix: str
+
+    def __init__(self, decoder: PipelineStep | None) -> None:
+        self.decoder = decoder
+        self.steps = []
+        self.mappings = []
+        self.suffix = ""
+        self.char_table = FusedTable(self.convert, by_code=True)
+        self.symbol_table = None
+        if decoder is not None:
+            symbol_mapping = decoder.cipher.symbol_mapping(decoder.key)
+            assert symbol_mapping is not None
+            self.symbol_table = FusedTable(lambda s: self.convert(symbol_mapping(s)), by_code=False)
+
+    def add(self, step: PipelineStep, mapping: tuple[Callable[[str], str | None], str]) -> None:
+        self.steps.append(step)
+        self.mappings.append(mapping)
+        self.suffix = mapping[1] + self.map(self.suffix, *mapping)
+
+    @staticmethod
+    def map(text: str, fn: Callable[[str], str | None], joiner: str) -> str:
+        return "".join([out + joiner for c in text if (out := fn(c)) is not None])
+
+    def convert(self, text: str) -> str:
+        for fn, joiner in self.mappings:
+            text = self.map(text, fn, joiner)
+        return text
+
+    def run(self, text: str) -> list[str]:
+        if self.decoder is None:
+            outputs = [text.translate(self.char_table)]
+        elif self.decoder.cipher.separator in text:
+            outputs = ["".join([self.symbol_table[s] for s in text.split(self.decoder.cipher.separator)])]
+        else:
+            # decoders may read unseparated input differently, e.g. as fixed width symbols
+            outputs = [t.translate(self.char_table) for t in self.decoder.run(text)]
+
+        if self.suffix != "":
+            outputs = [o[:-len(self.suffix)] if o.endswith(self.suffix) else o for o in outputs]
+        return outputs
+
+
+def find_cipher(name: str) -> Cipher:
+    folded = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii").lower()
+    for cipher in all_ciphers:
+        if unicodedata.normalize("NFKD", cipher.name).encode("ascii", "ignore").decode("ascii").lower() == folded:
+            return cipher
+    raise ValueError(f"Unknown cipher '{name}', use one of {', '.join([c.name for c in all_ciphers])}")
+
+
+class CipherPipeline:
+    steps: list[PipelineStep]
+    stages: list[PipelineStep | FusedRun]
+
+    def __init__(self, steps: Sequence[PipelineStep]) -> None:
+        self.steps = list(steps)
+        self.stages = self.compile(self.steps)
+
+    @staticmethod
+    def compile(steps: list[PipelineStep]) -> list[PipelineStep | FusedRun]:
+        stages = []
+        run = None
+        for step in steps:
+            mapping = step.cipher.char_mapping(step.key, step.decoding)
+            if mapping is not None:
+                if run is None:
+                    run = FusedRun(None)
+                    stages.append(run)
+                run.add(step, mapping)
+            elif step.decoding and step.cipher.symbol_mapping(step.key) is not None:
+                run = FusedRun(step)
+                stages.append(run)
+            else:
+                stages.append(step)
+                run = None
+        return stages
+
+    @classmethod
+    def parse(cls, spec: str) -> "CipherPipeline":
+        # one step per line or separated by "->" or ";", each "<cipher> encode|decode [key]"
+        steps = []
+        for line in re.split(r"\n|->|;", spec):
+            words = line.split()
+            if len(words) == 0:
+                continue
+            if len(words) < 2 or words[1].lower() not in ["encode", "decode"]:
+                raise ValueError(f"Steps are '<cipher> encode|decode [key]', not '{line.strip()}'")
+            key = " ".join(words[2:]) if len(words) > 2 else None
+            steps.append(PipelineStep(find_cipher(words[0]), key, words[1].lower() == "decode"))
+        if len(steps) == 0:
+            raise ValueError("The pipeline has no steps")
+        return cls(steps)
+
+    def run(self, text: str) -> list[str]:
+        # every step may give several results (e.g. all Caesar shifts), each of them continues through the pipeline
+        texts = [text]
+        for stage in self.stages:
+            texts = [t for text in texts for t in stage.run(text)]
+        return texts
+
+    def run_unfused(self, text: str) -> list[str]:
+        texts = [text]
+        for step in self.steps:
+            texts = [t for text in texts for t in step.run(text)]
+        return texts
+
+    # a pipeline is also a bruteforce transform
+
+    @property
+    def __name__(self) -> str:
+        return f"pipeline {self}"
+
+    def __call__(self, string: str) -> list[tuple[str, str]]:
+        return [(t, self.__name__) for t in self.run(string)]
+
+    def __str__(self) -> str:
+        return " -> ".join([str(step) for step in self.steps])
@@ -0,0 +1,443 @@
+import re
+import re._parser as sre_parse
+import re._constants as sre_constants
+from array import array
+from collections import deque
+from collections.abc import Sequence
+
+from lexicon import Lexicon
+
+import numpy as np
+
+# Literal analysis of regular expressions
+#
+# A pattern is reduced to a list of clauses, each clause a set of alternative literals of which at least one
+# has to occur in every matching word ("wa.+(er|it)" -> [{"wa"}, {"er", "it"}]). Anything the analysis does
+# not understand simply contributes no clause, so the clauses are always a necessary condition.
+
+MAX_EXACT_STRINGS = 64
+
+
+def _useful_clause(strings: set[str] | None) -> bool:
+    return strings is not None and len(strings) > 0 and all([len(s) >= 2 for s in strings])
+
+def _product(a: set[str], b: set[str]) -> set[str] | None:
+    if len(a) * len(b) > MAX_EXACT_STRINGS:
+        return None
+    return {x + y for x in a for y in b}
+
+def _analyze_sequence(items) -> tuple[set[str] | None, list[set[str]]]:
+    clauses = []
+    run = {""}
+    all_exact = True
+
+    for op, av in items:
+        exact, inner = _analyze_item(op, av)
+        if exact is not None:
+            product = _product(run, exact)
+            if product is not None:
+                run = product
+                continue
+            all_exact = False
+            if _useful_clause(run):
+                clauses.append(run)
+            run = exact
+            continue
+
+        all_exact = False
+        if _useful_clause(run):
+            clauses.append(run)
+        clauses += inner
+        run = {""}
+
+    if _useful_clause(run):
+        clauses.append(run)
+    return (run if all_exact else None), clauses
+
+def _analyze_item(op, av) -> tuple[set[str] | None, list[set[str]]]:
+    if op is sre_constants.LITERAL:
+        c = chr(av)
+        return ({c.lower()}, []) if c.isascii() and c.isalnum() else (None, [])
+
+    if op is sre_constants.IN:
+        chars = set()
+        for in_op, in_av in av:
+            if in_op is sre_constants.LITERAL and chr(in_av).isascii() and chr(in_av).isalnum():
+                chars.add(chr(in_av).lower())
+            else:
+                return None, []
+        return (chars, []) if len(chars) <= 4 else (None, [])
+
+    if op is sre_constants.AT:
+        return {""}, []
+
+    if op is sre_constants.SUBPATTERN:
+        return _analyze_sequence(av[-1])
+
+    if op is sre_constants.ATOMIC_GROUP:
+        return _analyze_sequence(av)
+
+    if op is sre_constants.BRANCH:
+        branches = [_analyze_sequence(b) for b in av[1]]
+        if all([exact is not None for exact, _ in branches]):
+            union = set().union(*[exact for exact, _ in branches])
+            if len(union) <= MAX_EXACT_STRINGS:
+                return union, []
+
+        # every branch has to contribute an alternative, otherwise nothing is required
+        alternatives = set()
+        for exact, inner in branches:
+            if _useful_clause(exact):
+                alternatives |= exact
+            elif len(inner) != 0:
+                alternatives |= min(inner, key=len)
+            else:
+                return None, []
+        return None, [alternatives]
+
+    if op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT, sre_constants.POSSESSIVE_REPEAT):
+        low, high, item = av
+        exact, inner = _analyze_sequence(item)
+        if exact is not None:
+            if low == high and len(exact) ** low <= MAX_EXACT_STRINGS:
+                repeated = {""}
+                for _ in range(low):
+                    repeated = {x + y for x in repeated for y in exact}
+                return repeated, []
+            if low == 0 and high == 1:
+                return exact | {""}, []
+        if low >= 1:
+            return None, inner + ([exact] if _useful_clause(exact) else [])
+        return None, []
+
+    return None, []
+
+def analyze_pattern(regex: re.Pattern) -> tuple[list[set[str]], int, int | None] | None:
+    try:
+        parsed = sre_parse.parse(regex.pattern, regex.flags)
+    except Exception:
+        return None
+
+    _, clauses = _analyze_sequence(parsed)
+    clauses = [set(c) for c in set([frozenset(c) for c in clauses])]
+    min_length, max_length = parsed.getwidth()
+    return clauses, min_length, (max_length if max_length < sre_constants.MAXREPEAT else None)
+
+
+class RegexSearchIndex:
+    grams: dict[str, array]
+    lengths: array
+    ids_by_length: dict[int, array]
+
+    def __init__(self, dictionary: Sequence[str]) -> None:
+        print(f"Building regex search index for {len(dictionary)} words...")
+        self.build_index(dictionary)
+        print(f"Regex search index built, {len(self.grams)} n-grams")
+
+    def build_index(self, dictionary: Sequence[str]):
+        self.grams = {}
+        self.lengths = array("I")
+        self.ids_by_length = {}
+
+        for i, word in enumerate(dictionary):
+            self.lengths.append(len(word))
+            self.ids_by_length.setdefault(len(word), array("I")).append(i)
+
+            word = word.lower()
+            for gram in set([word[j:j+2] for j in range(len(word) - 1)] + [word[j:j+3] for j in range(len(word) - 2)]):
+                self.grams.setdefault(gram, array("I")).append(i)
+
+    def lookup_literal(self, literal: str) -> set[int]:
+        grams = [literal] if len(literal) == 2 else [literal[j:j+3] for j in range(len(literal) - 2)]
+        postings = sorted([self.grams.get(g, array("I")) for g in set(grams)], key=len)
+        candidates = set(postings[0])
+        for p in postings[1:]:
+            if len(candidates) == 0:
+                break
+            candidates.intersection_update(p)
+        return candidates
+
+    def candidates(self, clauses: list[set[str]], min_length: int, max_length: int | None) -> set[int] | None:
+        candidates = None
+
+        for clause in sorted(clauses, key=len):
+            matches = set().union(*[self.lookup_literal(literal) for literal in clause])
+            candidates = matches if candidates is None else candidates & matches
+            if len(candidates) == 0:
+                return candidates
+
+        if candidates is not None:
+            lengths = self.lengths
+            return {i for i in candidates if min_length <= lengths[i] and (max_length is None or lengths[i] <= max_length)}
+
+        lengths_in_range = [l for l in self.ids_by_length if min_length <= l and (max_length is None or l <= max_length)]
+        in_range = sum([len(self.ids_by_length[l]) for l in lengths_in_range])
+        if in_range * 2 > sum([len(ids) for ids in self.ids_by_length.values()]):
+            return None  # barely narrows it down, a full scan is cheaper than collecting and sorting the ids
+        return {i for l in lengths_in_range for i in self.ids_by_length[l]}
+
+    def search(self, regex: re.Pattern, dictionary: Sequence[str]) -> list[str]:
+        analysis = analyze_pattern(regex)
+        candidates = self.candidates(*analysis) if analysis is not None else None
+
+        words = dictionary.words() if isinstance(dictionary, Lexicon) else dictionary
+        if candidates is None:
+            return [word for word in words if regex.fullmatch(word)]
+        return [word for word in (words[i] for i in sorted(candidates)) if regex.fullmatch(word)]
+
+
+# Letter multiset index
+#
+# Every entry is stored as a vector of letter counts (a-z, plus one column for everything else), bucketed by
+# length. Blank tiles and sub-anagrams become vectorized superset / subset comparisons over one bucket.
+
+LETTER_COLUMNS = 27
+
+def count_letters(words: list[str], length: int) -> np.ndarray:
+    codes = np.frombuffer("".join(words).encode("ascii", "replace"), dtype=np.uint8).reshape(len(words), length)
+    columns = codes.astype(np.int16) - 97
+    columns[(columns < 0) | (columns >= 26)] = 26
+
+    counts = np.zeros((len(words), LETTER_COLUMNS), dtype=np.uint8)
+    rows = np.arange(len(words))
+    for position in range(length):
+        counts[rows, columns[:, position]] += 1
+    return counts
+
+
+class LetterCountIndex:
+    entries: list[str]
+    buckets: dict[int, tuple[np.ndarray, np.ndarray]]  # length -> (entry ids, letter counts)
+
+    def __init__(self, entries: list[str]) -> None:
+        self.entries = entries
+        self.buckets = {}
+
+        ids_by_length = {}
+        for i, entry in enumerate(entries):
+            ids_by_length.setdefault(len(entry), []).append(i)
+
+        for length, ids in ids_by_length.items():
+            self.buckets[length] = (np.array(ids, dtype=np.uint32), count_letters([entries[i] for i in ids], length))
+
+    def find(self, letters: str, blanks: int = 0, partial: bool = False) -> list[str]:
+        ids, _ = self.find_ids(letters, blanks, partial)
+        return [self.entries[i] for i in ids]
+
+    def find_ids(self, letters: str, blanks: int = 0, partial: bool = False) -> tuple[np.ndarray, np.ndarray]:
+        # ids of the matching entries, longest first, and their letter counts
+        query = count_letters([letters], len(letters))[0].astype(np.int16)
+        total = len(letters) + blanks
+
+        found_ids, found_counts = [np.zeros(0, dtype=np.uint32)], [np.zeros((0, LETTER_COLUMNS), dtype=np.uint8)]
+        for length in sorted(self.buckets.keys(), reverse=True):
+            if length > total or (not partial and length != total):
+                continue
+            ids, counts = self.buckets[length]
+
+            if partial:
+                # letters the entry needs beyond the given ones have to be covered by blanks
+                missing = np.maximum(counts.astype(np.int16) - query, 0).sum(axis=1)
+                matches = missing <= blanks
+            else:
+                matches = np.all(counts >= query, axis=1)
+
+            found_ids.append(ids[matches])
+            found_counts.append(counts[matches])
+        return np.concatenate(found_ids), np.concatenate(found_counts)
+
+
+# Positional bitset index
+#
+# For every word length there is one bitset (a Python int, bit i = i-th word of that length) per (position, letter)
+# and per contained letter. Crossword style patterns like "w.ter.rop" are answered with a few big-int ANDs.
+
+SIMPLE_PATTERN = re.compile(r"[a-z.]+", re.IGNORECASE)
+
+def set_bits(bits: int, length: int) -> np.ndarray:
+    packed = np.frombuffer(bits.to_bytes((length + 7) // 8, "little"), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(packed, bitorder="little"))
+
+def letter_column(c: str) -> int:
+    n = ord(c) - 97
+    return n if 0 <= n < 26 else 26
+
+
+class PatternIndex:
+    ids_by_length: dict[int, array]
+    position_bits: dict[int, list[list[int]]]  # length -> position -> letter column -> bitset
+    contains_bits: dict[int, list[int]]  # length -> letter column -> bitset
+
+    def __init__(self, dictionary: Sequence[str]) -> None:
+        print(f"Building pattern index for {len(dictionary)} words...")
+        self.build_index(dictionary)
+        print(f"Pattern index built, {len(self.ids_by_length)} word lengths")
+
+    def build_index(self, dictionary: Sequence[str]):
+        self.ids_by_length = {}
+        for i, word in enumerate(dictionary):
+            self.ids_by_length.setdefault(len(word), array("I")).append(i)
+
+        self.position_bits = {}
+        self.contains_bits = {}
+        for length, ids in self.ids_by_length.items():
+            # collect bit positions per column first, setting bits one by one on big ints is quadratic
+            positions = [[[] for _ in range(LETTER_COLUMNS)] for _ in range(length)]
+            for bit, i in enumerate(ids):
+                for p, c in enumerate(dictionary[i].lower()):
+                    positions[p][letter_column(c)].append(bit)
+
+            self.position_bits[length] = [[self.to_bitset(bits, len(ids)) for bits in column] for column in positions]
+            self.contains_bits[length] = [self.union([self.position_bits[length][p][c] for p in range(length)]) for c in range(LETTER_COLUMNS)]
+
+    @staticmethod
+    def to_bitset(bits: list[int], length: int) -> int:
+        flags = np.zeros(length, dtype=np.uint8)
+        flags[bits] = 1
+        return int.from_bytes(np.packbits(flags, bitorder="little").tobytes(), "little")
+
+    @staticmethod
+    def union(bitsets: list[int]) -> int:
+        result = 0
+        for b in bitsets:
+            result |= b
+        return result
+
+    @staticmethod
+    def fits(pattern: str) -> bool:
+        return SIMPLE_PATTERN.fullmatch(pattern) is not None
+
+    @staticmethod
+    def fits_letters(letters: str) -> bool:
+        return all(["a" <= c <= "z" or c == " " for c in letters.lower()])
+
+    def search(self, pattern: str, dictionary: Sequence[str], must_contain: str = "", must_not_contain: str = "") -> list[str]:
+        pattern = pattern.lower()
+        length = len(pattern)
+        if length not in self.ids_by_length:
+            return []
+
+        ids = self.ids_by_length[length]
+        bits = (1 << len(ids)) - 1
+
+        for p, c in enumerate(pattern):
+            if c != ".":
+                bits &= self.position_bits[length][p][letter_column(c)]
+        for c in set(must_contain.lower()):
+            if c != " ":
+                bits &= self.contains_bits[length][letter_column(c)]
+        for c in set(must_not_contain.lower()):
+            if c != " ":
+                bits &= ~self.contains_bits[length][letter_column(c)]
+
+        return [dictionary[ids[bit]] for bit in set_bits(bits, len(ids))]
+
+
+# Aho-Corasick automaton
+#
+# Finds every dictionary word occurring in a text in one pass. The goto edges alone form a plain prefix trie of
+# the dictionary, which is also used for pruned path searches.
+
+class WordAutomaton:
+    goto: list[dict[str, int]]
+    fail: array
+    output: array  # next node along the fail links that ends a word, 0 if none
+    depth: array
+    is_word: bytearray
+
+    def __init__(self, dictionary: Sequence[str]) -> None:
+        print(f"Building word automaton for {len(dictionary)} words...")
+        self.build_automaton(dictionary)
+        print(f"Word automaton built, {len(self.goto)} states")
+
+    def build_automaton(self, dictionary: Sequence[str]):
+        self.goto = [{}]
+        self.depth = array("I", [0])
+        self.is_word = bytearray(1)
+
+        for word in dictionary:
+            node = 0
+            for c in word:
+                next_node = self.goto[node].get(c)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto[node][c] = next_node
+                    self.goto.append({})
+                    self.depth.append(self.depth[node] + 1)
+                    self.is_word.append(0)
+                node = next_node
+            if node != 0:
+                self.is_word[node] = 1
+
+        # breadth first, fail links of shallower states are known when they are needed
+        self.fail = array("i", [0] * len(self.goto))
+        self.output = array("i", [0] * len(self.goto))
+        queue = deque(self.goto[0].values())
+        while len(queue) != 0:
+            node = queue.popleft()
+            for c, child in self.goto[node].items():
+                fallback = self.fail[node]
+                while fallback != 0 and c not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(c, 0)
+                self.fail[child] = target if target != child else 0
+                self.output[child] = self.fail[child] if self.is_word[self.fail[child]] else self.output[self.fail[child]]
+                queue.append(child)
+
+    def step(self, node: int, c: str) -> int:
+        while node != 0 and c not in self.goto[node]:
+            node = self.fail[node]
+        return self.goto[node].get(c, 0)
+
+    def scan(self, text: str, min_length: int = 1) -> list[tuple[int, int]]:
+        # (start, length) of every word occurrence, ordered by end position
+        matches = []
+        goto, fail, output, depth, is_word = self.goto, self.fail, self.output, self.depth, self.is_word
+        node = 0
+        for i, c in enumerate(text):
+            while node != 0 and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+
+            match = node if is_word[node] else output[node]
+            while match != 0:
+                if depth[match] >= min_length:
+                    matches.append((i - depth[match] + 1, depth[match]))
+                match = output[match]
+        return matches
+
+
+# Rotation invariant word index
+#
+# A Caesar shift keeps the differences between neighbouring letters, so every word is indexed by its difference
+# signature ("water" -> w->a, a->t, t->e, e->r). One automaton pass over the signature of a text finds the words
+# of all 26 rotations; the first letter of the match then tells the rotation.
+
+def shift_signature(text: str) -> str:
+    codes = [ord(c) - 97 if "a" <= c <= "z" else -1 for c in text]
+    return "".join([chr(97 + (b - a) % 26) if a != -1 and b != -1 else "#" for a, b in zip(codes, codes[1:])])
+
+
+class ShiftSignatureIndex:
+    automaton: WordAutomaton
+    first_letters: dict[str, str]  # signature -> first letters of the words sharing it
+
+    def __init__(self, dictionary: Sequence[str]) -> None:
+        print(f"Building shift signature index for {len(dictionary)} words...")
+        self.first_letters = {}
+        for word in dictionary:
+            if len(word) < 2 or any([not "a" <= c <= "z" for c in word]):
+                continue
+            signature = shift_signature(word)
+            self.first_letters[signature] = self.first_letters.get(signature, "") + word[0]
+        self.automaton = WordAutomaton(list(self.first_letters.keys()))
+        print(f"Shift signature index built, {len(self.first_letters)} signatures")
+
+    def scan(self, text: str, min_length: int = 2) -> list[tuple[int, int, int]]:
+        # (start, length, rotation) of every word occurring in any rotation of text
+        signature = shift_signature(text)
+        matches = []
+        for start, length in self.automaton.scan(signature, max(min_length - 1, 1)):
+            for first in self.first_letters[signature[start:start + length]]:
+                matches.append((start, length + 1, (ord(text[start]) - ord(first)) % 26))
+        return matches